@@ -0,0 +1,184 @@
+"""
+Admission control for the review service
+
+Caps how many requests can be doing database work at once in this process. Beyond
+that, requests queue briefly, and once the queue is full, queueing takes too long or
+the pool is already backed up, they're turned away with a fast 503 and Retry-After
+rather than left to time out at the load balancer. Optionally, each client is also
+rate limited with a token bucket.
+"""
+
+import asyncio
+import os
+import time
+from typing import Dict, Optional, Tuple
+
+from db.engine import POOL_MAX_SIZE, pool_wait
+from logger import log
+from piccolo_api.rate_limiting.middleware import RateLimitError, RateLimitProvider
+from starlette.responses import Response
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+# Requests allowed to run at once, by default one per pooled connection
+MAX_IN_FLIGHT = int(os.getenv("ADMISSION_MAX_IN_FLIGHT", str(POOL_MAX_SIZE)))
+
+# Requests allowed to wait for a slot, and for how long (seconds)
+MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "50"))
+MAX_QUEUE_WAIT = float(os.getenv("ADMISSION_MAX_QUEUE_WAIT", "2.0"))
+
+# Shed requests that would queue while the average wait for a connection is above this
+MAX_POOL_WAIT = float(os.getenv("ADMISSION_MAX_POOL_WAIT", "0.5"))
+
+# Seconds clients are told to back off for
+RETRY_AFTER = int(os.getenv("ADMISSION_RETRY_AFTER", "1"))
+
+# Per client token bucket, disabled when the rate is 0
+RATE_LIMIT_PER_SECOND = float(os.getenv("RATE_LIMIT_PER_SECOND", "0"))
+RATE_LIMIT_BURST = int(os.getenv("RATE_LIMIT_BURST", "20"))
+
+# Proxies in front of the load balancer that append to X-Forwarded-For, 1 behind
+# CloudFront
+PROXY_HOPS = int(os.getenv("PROXY_HOPS", "0"))
+
+# Paths under the base path that are always admitted, the load balancer must be able
+# to health check an overloaded task
+UNLIMITED_PATHS = {"health"}
+
+
+class TokenBucketLimitProvider(RateLimitProvider):
+    """
+    Each client gets a bucket of `burst` tokens, refilled at `rate` tokens per second.
+    A request takes a token, and is rejected when the bucket is empty.
+    """
+
+    def __init__(self, rate: float, burst: int, max_clients: int = 10000) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        # Maps a client identifier to its tokens and when they were last counted
+        self.buckets: Dict[str, Tuple[float, float]] = {}
+
+    def _prune(self, now: float) -> None:
+        # Buckets that have refilled completely are the same as new ones
+        self.buckets = {
+            identifier: (tokens, updated)
+            for identifier, (tokens, updated) in self.buckets.items()
+            if tokens + (now - updated) * self.rate < self.burst
+        }
+
+    def increment(self, identifier: str):
+        now = time.monotonic()
+        tokens, updated = self.buckets.get(identifier, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        if tokens < 1:
+            self.buckets[identifier] = (tokens, now)
+            raise RateLimitError()
+        self.buckets[identifier] = (tokens - 1, now)
+        if len(self.buckets) > self.max_clients:
+            self._prune(now)
+
+
+def client_identifier(scope: Scope, proxy_hops: int = PROXY_HOPS) -> str:
+    """
+    The client's address. The load balancer appends the address it was connected from
+    to X-Forwarded-For, as does each proxy in front of it, so the client is proxy_hops
+    entries from the right. Entries further left were sent by the client.
+    """
+    addresses = [
+        address.strip()
+        for name, value in scope["headers"]
+        if name == b"x-forwarded-for"
+        for address in value.decode("latin-1").split(",")
+        if address.strip()
+    ]
+    if addresses:
+        return addresses[max(0, len(addresses) - 1 - proxy_hops)]
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+class AdmissionControlMiddleware:
+    """Admits, queues or sheds requests under base_path"""
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        base_path: str,
+        max_in_flight: int = MAX_IN_FLIGHT,
+        max_queue: int = MAX_QUEUE,
+        max_queue_wait: float = MAX_QUEUE_WAIT,
+        max_pool_wait: float = MAX_POOL_WAIT,
+        retry_after: int = RETRY_AFTER,
+        rate_limiter: Optional[RateLimitProvider] = None,
+    ) -> None:
+        self.app = app
+        self.base_path = base_path.rstrip("/")
+        self.slots = asyncio.Semaphore(max_in_flight)
+        self.max_queue = max_queue
+        self.max_queue_wait = max_queue_wait
+        self.max_pool_wait = max_pool_wait
+        self.retry_after = retry_after
+        self.rate_limiter = rate_limiter
+        self.queued = 0
+
+    def _limited(self, scope: Scope) -> bool:
+        if scope["type"] != "http":
+            return False
+        path = scope["path"]
+        if not path.startswith(self.base_path + "/"):
+            return False
+        return path[len(self.base_path) :].strip("/") not in UNLIMITED_PATHS
+
+    async def _reject(
+        self, status_code: int, reason: str, scope: Scope, receive: Receive, send: Send
+    ) -> None:
+        log.debug("Request rejected", extra={"reason": reason, "status": status_code})
+        response = Response(
+            reason,
+            status_code=status_code,
+            headers={"Retry-After": str(self.retry_after)},
+        )
+        await response(scope, receive, send)
+
+    async def _acquire(self) -> Optional[str]:
+        """Takes a slot, or returns why the request can't have one"""
+        if not self.slots.locked():
+            await self.slots.acquire()
+            return None
+        if self.queued >= self.max_queue:
+            return "Too many queued requests"
+        self.queued += 1
+        try:
+            await asyncio.wait_for(self.slots.acquire(), self.max_queue_wait)
+        except asyncio.TimeoutError:
+            return "Timed out waiting for capacity"
+        finally:
+            self.queued -= 1
+        return None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if not self._limited(scope):
+            await self.app(scope, receive, send)
+            return
+
+        if self.rate_limiter:
+            try:
+                self.rate_limiter.increment(client_identifier(scope))
+            except RateLimitError:
+                await self._reject(429, "Too many requests", scope, receive, send)
+                return
+
+        # Only shed on pool wait when this request would have to queue anyway
+        if self.slots.locked() and pool_wait.current() > self.max_pool_wait:
+            await self._reject(503, "Database pool saturated", scope, receive, send)
+            return
+
+        reason = await self._acquire()
+        if reason:
+            await self._reject(503, reason, scope, receive, send)
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.slots.release()
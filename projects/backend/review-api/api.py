@@ -1,23 +1,104 @@
+import asyncio
+import time
 from contextlib import asynccontextmanager
-from typing import Any, Generator
+from typing import Any, Generator, List, cast
 
-from db.tables import Reviews
-from fastapi import APIRouter, FastAPI, status
+from admission import (
+    RATE_LIMIT_BURST,
+    RATE_LIMIT_PER_SECOND,
+    AdmissionControlMiddleware,
+    TokenBucketLimitProvider,
+)
+from cache import CacheControlMiddleware, flush_purges
+from coalesce import CoalescingMiddleware
+from compression import CompressionMiddleware
+from crud import BATCH_GET_MAX_IDS, BATCH_POST_MAX_IDS, ReviewsCRUD
+from db.engine import (
+    POOL_MAX_IDLE,
+    POOL_MAX_SIZE,
+    POOL_MIN_SIZE,
+    WARMUP_TIMEOUT,
+    ReviewsEngine,
+)
+from db.indexes import ensure_indexes
+from db.partitions import ensure_partitions
+from fastapi import APIRouter, FastAPI, Request, Response, status
+from ingest import WRITE_BEHIND, IngestWorkers, open_queue
+from logger import AccessLogMiddleware, configure_logging, log
 from piccolo.engine import engine_finder
-from piccolo_api.fastapi.endpoints import FastAPIKwargs, FastAPIWrapper, PiccoloCRUD
+from piccolo_api.fastapi.endpoints import FastAPIKwargs, FastAPIWrapper
 from pydantic import BaseModel
+from tracing import TRACING_ENABLED, configure_tracing
 
 # Very important, load balancer/service will cry if not this path
 API_BASE_PATH = "/review"
 
+# JSON logs, written off the event loop
+log_listener = configure_logging()
+
+# Optional write-behind mode for new reviews, see ingest.py
+write_queue = open_queue() if WRITE_BEHIND else None
+ingest_workers = IngestWorkers(write_queue, API_BASE_PATH) if write_queue else None
+
+# A very convenient CRUD wrapper for our Reviews table, see crud.py
+reviews_crud = ReviewsCRUD(read_only=False, write_queue=write_queue)
+
 
 # These are startup and shutdown events called in our lifespan func
 async def open_database_connection_pool() -> None:
     try:
-        engine = engine_finder()
-        await engine.start_connection_pool()
+        engine = cast(ReviewsEngine, engine_finder())
+        # Connections are opened by warm_up_database_connection_pool, not here
+        await engine.start_connection_pool(
+            min_size=0,
+            max_size=POOL_MAX_SIZE,
+            max_inactive_connection_lifetime=POOL_MAX_IDLE,
+        )
+    except Exception:
+        log.exception("Unable to connect to the database")
+
+
+async def warm_up_database_connection_pool(app: FastAPI) -> None:
+    # Readiness is held back until the pool is full and the hot statements are
+    # prepared, or until the timeout, after which we serve with what's warm
+    started = time.perf_counter()
+    try:
+        engine = cast(ReviewsEngine, engine_finder())
+        await asyncio.wait_for(
+            engine.warm_up(reviews_crud.hot_queries(), POOL_MIN_SIZE), WARMUP_TIMEOUT
+        )
+        log.info(
+            "Warmed up the database connection pool",
+            extra={"duration": round(time.perf_counter() - started, 3)},
+        )
+    except asyncio.TimeoutError:
+        log.warning(
+            "Timed out warming up the database connection pool",
+            extra={"timeout": WARMUP_TIMEOUT},
+        )
+    except Exception:
+        log.exception("Unable to warm up the database connection pool")
+    app.state.ready = True
+
+
+async def create_partitions() -> None:
+    # Months ahead are created in advance, so new reviews never land in the default
+    try:
+        created = await ensure_partitions()
+        if created:
+            log.info("Created partitions", extra={"partitions": created})
+    except Exception:
+        log.exception("Unable to create partitions")
+
+
+async def create_indexes() -> None:
+    # Built concurrently, partition by partition, so writes carry on in the meantime
+    try:
+        built = await ensure_indexes()
+        if built:
+            log.info("Built indexes", extra={"indexes": built})
     except Exception:
-        print("Unable to connect to the database")
+        log.exception("Unable to build indexes")
 
 
 async def close_database_connection_pool() -> None:
@@ -25,17 +106,39 @@ async def close_database_connection_pool() -> None:
         engine = engine_finder()
         await engine.close_connection_pool()
     except Exception:
-        print("Unable to connect to the database")
+        log.exception("Unable to connect to the database")
 
 
 # This is a lifespan event for the FastAPI instance
 @asynccontextmanager
 async def lifespan(app: FastAPI) -> Generator[None, Any, None]:
-    # Open db connection
+    # Open db connection, and fill it in the background while health reports 503
     await open_database_connection_pool()
+    warm_up = asyncio.create_task(warm_up_database_connection_pool(app))
+    # Create upcoming Reviews partitions
+    await create_partitions()
+    # Build any missing indexes in the background
+    build_indexes = asyncio.create_task(create_indexes())
+    # Start draining queued reviews
+    if ingest_workers:
+        ingest_workers.start()
     yield
+    # Stop warming up and building indexes, if we're shut down before they're done
+    warm_up.cancel()
+    build_indexes.cancel()
+    app.state.ready = False
+    # Stop draining queued reviews
+    if ingest_workers:
+        await ingest_workers.stop()
+    # Invalidate what the last writes changed, rather than wait out the interval
+    await flush_purges()
     # Close db connection
     await close_database_connection_pool()
+    # Export any buffered spans
+    if tracer_provider:
+        tracer_provider.shutdown()
+    # Flush any queued log records
+    log_listener.stop()
 
 
 # API init
@@ -48,6 +151,9 @@ api = FastAPI(
     lifespan=lifespan,
 )
 
+# Set once the connection pool is warmed up, see lifespan
+api.state.ready = False
+
 # We only need the router to configure a new base path
 router = APIRouter(prefix=API_BASE_PATH)
 
@@ -61,23 +167,82 @@ class Health(BaseModel):
 @router.get(
     "/health",
     tags=["Health"],
-    response_description="Return OK (200) if API is healthy",
+    response_description="Return OK (200) if API is healthy, 503 if it isn't ready for traffic",
     response_model=Health,
     status_code=status.HTTP_200_OK,
 )
-def get_health() -> Health:
+def get_health(request: Request, response: Response) -> Health:
     """Health check for load balancer"""
+    if not request.app.state.ready:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+        return Health(status="Not ready")
     return Health
 
 
-# A very convenient CRUD wrapper for our Reviews table
+class Batch(BaseModel):
+    """Review ids to fetch with POST /batch"""
+
+    ids: List[str]
+
+
+# Registered ahead of the CRUD routes, which would take "batch" for a review id
+@router.get(
+    "/batch",
+    tags=["Review"],
+    response_description="The reviews in the order requested, null where not found",
+)
+async def get_batch(request: Request) -> Response:
+    """Fetch several reviews at once, ?ids=a,b,c or ?ids=a&ids=b"""
+    ids = [
+        row_id
+        for value in request.query_params.getlist("ids")
+        for row_id in value.split(",")
+        if row_id
+    ]
+    return await reviews_crud.get_batch(ids, BATCH_GET_MAX_IDS)
+
+
+@router.post(
+    "/batch",
+    tags=["Review"],
+    response_description="The reviews in the order requested, null where not found",
+)
+async def post_batch(batch: Batch) -> Response:
+    """Fetch several reviews at once, for lists of ids too long for a URL"""
+    return await reviews_crud.get_batch(batch.ids, BATCH_POST_MAX_IDS)
+
+
 FastAPIWrapper(
     "/",
     fastapi_app=router,
-    piccolo_crud=PiccoloCRUD(Reviews, read_only=False),
+    piccolo_crud=reviews_crud,
     fastapi_kwargs=FastAPIKwargs(
         all_routes={"tags": ["Review"]},
     ),
 )
 
 api.include_router(router)
+
+# Bounded DB concurrency per process, sheds load with a 503 once the pool backs up
+api.add_middleware(
+    AdmissionControlMiddleware,
+    base_path=API_BASE_PATH,
+    rate_limiter=TokenBucketLimitProvider(RATE_LIMIT_PER_SECOND, RATE_LIMIT_BURST)
+    if RATE_LIMIT_PER_SECOND > 0
+    else None,
+)
+
+# Concurrent identical reads share one response, and so one pooled connection
+api.add_middleware(CoalescingMiddleware, base_path=API_BASE_PATH)
+
+# gzip/brotli for anything big enough to be worth it
+api.add_middleware(CompressionMiddleware)
+
+# Cache headers for the CloudFront distribution, and edge purges after writes
+api.add_middleware(CacheControlMiddleware, base_path=API_BASE_PATH)
+
+# Request ids and access logs
+api.add_middleware(AccessLogMiddleware)
+
+# Traces for the ADOT collector sidecar, see deployment/__main__.py
+tracer_provider = configure_tracing(api) if TRACING_ENABLED else None
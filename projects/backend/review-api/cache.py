@@ -0,0 +1,237 @@
+"""
+HTTP caching for the review service
+
+Reads are marked cacheable for the CloudFront distribution in front of the load
+balancer (see projects/load_balancer), writes are marked uncacheable and trigger an
+invalidation of the paths they affect.
+"""
+
+import asyncio
+import os
+import time
+from typing import Any, Iterable, List, Optional, Set
+from urllib.parse import parse_qsl
+
+from logger import log
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Browser and edge lifetimes for successful reads, set by the task definition
+CACHE_MAX_AGE = int(os.getenv("CACHE_MAX_AGE", "0"))
+CACHE_S_MAXAGE = int(os.getenv("CACHE_S_MAXAGE", "300"))
+
+# Empty when the service isn't behind CloudFront, purging is then skipped
+CLOUDFRONT_DISTRIBUTION_ID = os.getenv("CLOUDFRONT_DISTRIBUTION_ID", "")
+
+# Paths under the base path that are never cached
+UNCACHED_PATHS = {"health", "docs", "redoc", "openapi.json"}
+
+# CRUD collection endpoints, anything else directly under the base path is a review id
+COLLECTION_PATHS = {"", "schema", "ids", "count", "references", "new", "batch"}
+
+# Collection endpoints that take a POST body but only read
+READ_ONLY_PATHS = {"batch"}
+
+# Query parameters in the edge cache key, the only ones CloudFront forwards. A read
+# with any other parameter isn't cached, as its response could differ from the one
+# cached under its key. Kept in step with REVIEW_CACHE_QUERY_STRINGS in
+# projects/load_balancer.
+CACHE_KEY_QUERY_STRINGS = {
+    "__order",
+    "__page",
+    "__page_size",
+    "__visible_fields",
+    "fields",
+    "__readable",
+    "__range_header",
+    "__range_header_name",
+    "id",
+    "ids",
+    "title",
+    "title__match",
+    "rating",
+    "rating__operator",
+    "body",
+    "body__match",
+    "created_on",
+    "created_on__operator",
+    "modified_on",
+    "modified_on__operator",
+}
+
+READ_METHODS = {"GET", "HEAD"}
+WRITE_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+
+# Seconds paths to purge are collected for, before one invalidation for all of them.
+# CloudFront bills each wildcard path and allows 15 in progress at once.
+PURGE_INTERVAL = float(os.getenv("PURGE_INTERVAL", "30"))
+
+# An invalidation with more wildcard paths than this is sent as one covering them all
+PURGE_MAX_WILDCARDS = 5
+
+# A single client, creating them from the default session isn't thread safe
+_cloudfront: Any = None
+if CLOUDFRONT_DISTRIBUTION_ID:
+    import boto3
+
+    _cloudfront = boto3.client("cloudfront")
+
+# Paths written to since the last invalidation, and the task that will invalidate them
+_pending_paths: Set[str] = set()
+_purge_task: Optional[asyncio.Task] = None
+
+
+def surrogate_keys(resource: str) -> str:
+    """Space separated keys identifying what a response depends on"""
+    if resource in COLLECTION_PATHS:
+        return "reviews"
+    return f"reviews review-{resource}"
+
+
+def in_cache_key(query_string: bytes) -> bool:
+    """Whether every parameter of a query string is part of the edge cache key"""
+    return all(
+        name in CACHE_KEY_QUERY_STRINGS
+        for name, _ in parse_qsl(query_string.decode("latin-1"), keep_blank_values=True)
+    )
+
+
+def purge_paths(base_path: str, resource: str) -> List[str]:
+    """Paths to invalidate after a write to the given resource"""
+    paths = [
+        f"{base_path}/",
+        f"{base_path}/?*",
+        f"{base_path}/ids/*",
+        f"{base_path}/count/*",
+        f"{base_path}/batch*",
+    ]
+    if resource not in COLLECTION_PATHS:
+        paths.append(f"{base_path}/{resource}*")
+    return paths
+
+
+def invalidation_paths(paths: Iterable[str]) -> List[str]:
+    """
+    Deduped paths for one invalidation, or a single wildcard covering them all when
+    they hold more than PURGE_MAX_WILDCARDS
+    """
+    unique = sorted(set(paths))
+    if sum("*" in path for path in unique) <= PURGE_MAX_WILDCARDS:
+        return unique
+    prefix = os.path.commonprefix(unique)
+    return [prefix[: prefix.rfind("/") + 1] + "*"]
+
+
+def _create_invalidation(paths: List[str]) -> None:
+    _cloudfront.create_invalidation(
+        DistributionId=CLOUDFRONT_DISTRIBUTION_ID,
+        InvalidationBatch={
+            "Paths": {"Quantity": len(paths), "Items": paths},
+            "CallerReference": f"review-api-{time.time_ns()}",
+        },
+    )
+
+
+async def _invalidate_pending() -> None:
+    if not _pending_paths:
+        return
+    paths = invalidation_paths(_pending_paths)
+    _pending_paths.clear()
+    try:
+        await asyncio.to_thread(_create_invalidation, paths)
+    except Exception:
+        log.exception("Unable to invalidate cached paths", extra={"paths": paths})
+
+
+async def _invalidate_every(interval: float) -> None:
+    while _pending_paths:
+        await asyncio.sleep(interval)
+        await _invalidate_pending()
+
+
+def purge(paths: Iterable[str]) -> None:
+    """
+    Invalidate paths at the edge without holding up the response. Paths are collected
+    for PURGE_INTERVAL and invalidated together.
+    """
+    global _purge_task
+    if not CLOUDFRONT_DISTRIBUTION_ID:
+        return
+    _pending_paths.update(paths)
+    if _purge_task is None or _purge_task.done():
+        _purge_task = asyncio.create_task(_invalidate_every(PURGE_INTERVAL))
+
+
+async def flush_purges() -> None:
+    """Invalidate any collected paths now rather than at the end of the interval"""
+    global _purge_task
+    if _purge_task:
+        _purge_task.cancel()
+        _purge_task = None
+    await _invalidate_pending()
+
+
+class CacheControlMiddleware:
+    """
+    Adds Cache-Control and Surrogate-Key headers to responses under base_path and
+    purges the edge cache once a write succeeds.
+    """
+
+    def __init__(self, app: ASGIApp, base_path: str) -> None:
+        self.app = app
+        self.base_path = base_path.rstrip("/")
+
+    def _resource(self, path: str) -> Optional[str]:
+        if not path.startswith(self.base_path + "/") and path != self.base_path:
+            return None
+        resource = path[len(self.base_path) :].strip("/").split("/", 1)[0]
+        if resource in UNCACHED_PATHS:
+            return None
+        return resource
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        resource = self._resource(scope["path"])
+        in_key = in_cache_key(scope.get("query_string", b""))
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                headers = [
+                    (name, value)
+                    for name, value in message.get("headers", [])
+                    if name.lower() != b"cache-control"
+                ]
+                status = message["status"]
+                if (
+                    resource is not None
+                    and in_key
+                    and method in READ_METHODS
+                    and status == 200
+                ):
+                    cache_control = (
+                        f"public, max-age={CACHE_MAX_AGE}, s-maxage={CACHE_S_MAXAGE}"
+                    )
+                    headers.append(
+                        (b"surrogate-key", surrogate_keys(resource).encode())
+                    )
+                else:
+                    cache_control = "no-store"
+                headers.append((b"cache-control", cache_control.encode()))
+                message["headers"] = headers
+
+                # Accepted (202) writes are purged by the ingest workers once stored
+                if (
+                    resource is not None
+                    and resource not in READ_ONLY_PATHS
+                    and method in WRITE_METHODS
+                    and status < 300
+                    and status != 202
+                ):
+                    purge(purge_paths(self.base_path, resource))
+
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,121 @@
+"""
+Request coalescing for the review service
+
+Concurrent identical reads share a single in-flight request: the first one runs,
+the rest wait for its response and get a copy of it. During a burst on a single
+review this keeps the pool down to one connection for that review instead of one
+per request.
+"""
+
+import asyncio
+import os
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode
+
+from logger import log
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# How long a follower waits on the in-flight request before running its own (seconds)
+COALESCE_MAX_WAIT = float(os.getenv("COALESCE_MAX_WAIT", "1.0"))
+
+# Responses larger than this aren't shared, followers run their own request instead
+COALESCE_MAX_BODY = 1024 * 1024
+
+# Paths under the base path that are never coalesced
+UNCOALESCED_PATHS = {"health"}
+
+# (method, path, normalized query string)
+Key = Tuple[str, str, str]
+
+# The leader's response start message and body, None if it can't be shared
+SharedResponse = Optional[Tuple[Message, List[bytes]]]
+
+
+def normalize_query(query_string: bytes) -> str:
+    """Order independent form of a query string, so ?a=1&b=2 and ?b=2&a=1 match"""
+    params = parse_qsl(query_string.decode("latin-1"), keep_blank_values=True)
+    return urlencode(sorted(params))
+
+
+class CoalescingMiddleware:
+    """Shares one in-flight response between concurrent identical GET/HEAD requests"""
+
+    def __init__(
+        self, app: ASGIApp, base_path: str, max_wait: float = COALESCE_MAX_WAIT
+    ) -> None:
+        self.app = app
+        self.base_path = base_path.rstrip("/")
+        self.max_wait = max_wait
+        self.in_flight: Dict[Key, asyncio.Future] = {}
+
+    def _key(self, scope: Scope) -> Optional[Key]:
+        if scope["type"] != "http" or scope["method"] not in ("GET", "HEAD"):
+            return None
+        path = scope["path"]
+        if not path.startswith(self.base_path + "/"):
+            return None
+        if path[len(self.base_path) :].strip("/") in UNCOALESCED_PATHS:
+            return None
+        return (scope["method"], path, normalize_query(scope["query_string"]))
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        key = self._key(scope)
+        if key is None:
+            await self.app(scope, receive, send)
+            return
+
+        leader = self.in_flight.get(key)
+        if leader is not None:
+            await self._follow(leader, scope, receive, send)
+        else:
+            await self._lead(key, scope, receive, send)
+
+    async def _follow(
+        self, leader: asyncio.Future, scope: Scope, receive: Receive, send: Send
+    ) -> None:
+        try:
+            shared: SharedResponse = await asyncio.wait_for(
+                asyncio.shield(leader), self.max_wait
+            )
+        except asyncio.TimeoutError:
+            log.warning("Coalesced request timed out", extra={"path": scope["path"]})
+            shared = None
+
+        if shared is None:
+            await self.app(scope, receive, send)
+            return
+
+        start, body = shared
+        await send(dict(start, headers=list(start.get("headers", []))))
+        for chunk in body[:-1]:
+            await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        await send({"type": "http.response.body", "body": body[-1] if body else b""})
+
+    async def _lead(self, key: Key, scope: Scope, receive: Receive, send: Send) -> None:
+        leader = asyncio.get_running_loop().create_future()
+        self.in_flight[key] = leader
+
+        start: Optional[Message] = None
+        body: List[bytes] = []
+        size = 0
+        complete = False
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal start, size, complete
+            if message["type"] == "http.response.start":
+                # Copied, outer middleware add per-request headers to the original
+                start = dict(message, headers=list(message.get("headers", [])))
+            elif message["type"] == "http.response.body":
+                chunk = message.get("body", b"")
+                size += len(chunk)
+                if size <= COALESCE_MAX_BODY:
+                    body.append(chunk)
+                complete = not message.get("more_body", False)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            del self.in_flight[key]
+            shareable = start is not None and complete and size <= COALESCE_MAX_BODY
+            leader.set_result((start, body) if shareable else None)
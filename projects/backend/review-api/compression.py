@@ -0,0 +1,121 @@
+"""
+Response compression for the review service
+
+Bodies over a minimum size are compressed with brotli when the client accepts it and
+the brotli package is installed, otherwise with gzip. Small bodies aren't worth the
+CPU and go out as they are.
+
+A strong ETag names exact bytes, so a compressed body's ETag gets the encoding added,
+"<tag>-gzip" or "<tag>-br". Requests sending one back in If-Match are matched against
+the version without it, see entity_tag.
+"""
+
+import gzip
+import os
+from typing import Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Bodies smaller than this (bytes) are sent uncompressed
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+
+# Fast settings, these are dynamic responses compressed on every request
+GZIP_LEVEL = 5
+BROTLI_QUALITY = 5
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """The best encoding the client accepts, if any"""
+    accepted = {
+        part.split(";")[0].strip().lower()
+        for part in accept_encoding.split(",")
+        if not part.strip().endswith("q=0")
+    }
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+def encoded_etag(etag: str, encoding: str) -> str:
+    """A strong ETag for an encoding of the body, weak ones already allow for it"""
+    if etag.startswith("W/") or not etag.endswith('"'):
+        return etag
+    return f'{etag[:-1]}-{encoding}"'
+
+
+def entity_tag(opaque_tag: str) -> str:
+    """An unquoted ETag value without the encoding added by encoded_etag"""
+    for encoding in ("br", "gzip"):
+        opaque_tag = opaque_tag.removesuffix(f"-{encoding}")
+    return opaque_tag
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+
+class CompressionMiddleware:
+    """
+    Compresses complete (non streaming) responses. Streaming responses are passed
+    through untouched.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = COMPRESSION_MIN_SIZE) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        start: Optional[Message] = None
+        streaming = False
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal start, streaming
+            if message["type"] == "http.response.start":
+                # Held back until we know the body, the headers depend on it
+                start = message
+                return
+
+            if message["type"] != "http.response.body" or start is None:
+                await send(message)
+                return
+
+            if streaming or message.get("more_body", False):
+                if not streaming:
+                    streaming = True
+                    await send(start)
+                await send(message)
+                return
+
+            headers = MutableHeaders(raw=start.setdefault("headers", []))
+            headers.add_vary_header("Accept-Encoding")
+            body = message.get("body", b"")
+            if (
+                encoding
+                and len(body) >= self.minimum_size
+                and "content-encoding" not in headers
+            ):
+                body = compress(body, encoding)
+                headers["Content-Encoding"] = encoding
+                headers["Content-Length"] = str(len(body))
+                if "etag" in headers:
+                    headers["ETag"] = encoded_etag(headers["etag"], encoding)
+                message = dict(message, body=body)
+            await send(start)
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,348 @@
+"""
+CRUD endpoints for the Reviews table
+"""
+
+import datetime
+import json
+import os
+import typing as t
+import uuid
+
+import pydantic
+from compression import entity_tag
+from db.columns import uuid7
+from db.tables import Reviews
+from ingest import WriteQueue
+from logger import log
+from piccolo.columns import Column
+from piccolo.columns.combination import Combinable, WhereRaw
+from piccolo.query import Query
+from piccolo.utils.encoding import dump_json
+from piccolo_api.crud.endpoints import CustomJSONResponse, PiccoloCRUD
+from piccolo_api.crud.exceptions import db_exception_handler
+from piccolo_api.crud.hooks import (
+    Hook,
+    HookType,
+    execute_delete_hooks,
+    execute_patch_hooks,
+    execute_post_hooks,
+)
+from piccolo_api.crud.validators import apply_validators
+from starlette.requests import Request
+from starlette.responses import Response
+
+# List views only need enough to render a summary, the full body is opt in
+LIST_FIELDS = ",".join(
+    column._meta.name for column in Reviews._meta.columns if column is not Reviews.body
+)
+
+# Most ids one batch fetch takes, GET is lower as the ids have to fit in the URL
+BATCH_GET_MAX_IDS = int(os.getenv("BATCH_GET_MAX_IDS", "100"))
+BATCH_POST_MAX_IDS = int(os.getenv("BATCH_POST_MAX_IDS", "1000"))
+
+
+def set_timestamps(row: Reviews) -> Reviews:
+    """
+    The POST model sends omitted timestamps as explicit nulls, which would skip the
+    column defaults. created_on is also the partition key, so it must be set.
+    """
+    now = datetime.datetime.now(datetime.timezone.utc)
+    if row.created_on is None:
+        row.created_on = now
+    if row.modified_on is None:
+        row.modified_on = now
+    return row
+
+
+def etag(modified_on: datetime.datetime) -> str:
+    """A review's version for ETag and If-Match, its modified_on timestamp"""
+    return f'"{modified_on.isoformat()}"'
+
+
+def parse_version(value: str) -> datetime.datetime:
+    """A modified_on timestamp as serialised in an ETag or response body"""
+    # Python 3.10's fromisoformat doesn't accept the Z pydantic writes
+    if value.endswith("Z"):
+        value = value[:-1] + "+00:00"
+    return datetime.datetime.fromisoformat(value)
+
+
+def parse_if_match(value: str) -> t.Optional[datetime.datetime]:
+    """
+    The version an If-Match header requires, None for * (any version). Raises a
+    ValueError if it isn't a version.
+    """
+    value = value.strip()
+    if value == "*":
+        return None
+    return parse_version(entity_tag(value.removeprefix("W/").strip('"')))
+
+
+class ReviewsCRUD(PiccoloCRUD):
+    """
+    PiccoloCRUD with a lightweight default projection for list views. Clients pick
+    columns with ``?fields=id,title,body`` (an alias of ``__visible_fields``), and
+    only those columns are selected.
+
+    Given a write_queue, new reviews are queued and stored later by the workers in
+    ingest.py, and POST answers 202 rather than 201.
+
+    PUT, PATCH and DELETE are each a single UPDATE/DELETE ... RETURNING, rather than
+    an existence check, the write and a read back. Responses to GET, PUT and PATCH
+    carry the review's version (its modified_on) as an ETag, and writes sent with
+    If-Match only apply to that version, answering 412 once it has changed.
+    """
+
+    def __init__(
+        self,
+        list_fields: str = LIST_FIELDS,
+        write_queue: t.Optional[WriteQueue] = None,
+        **kwargs: t.Any,
+    ) -> None:
+        hooks = [Hook(HookType.pre_save, set_timestamps), *kwargs.pop("hooks", [])]
+        super().__init__(Reviews, hooks=hooks, **kwargs)
+        self.list_fields = list_fields
+        self.write_queue = write_queue
+
+    def hot_queries(self) -> t.List[Query]:
+        """
+        The queries behind a detail fetch and the default list page. Their SQL matches
+        what the endpoints run, so executing them once on a connection leaves them in
+        asyncpg's statement cache, see ReviewsEngine.warm_up.
+        """
+        row_id = uuid7()
+        primary_key = self.table._meta.primary_key
+        list_columns = [
+            self.table._meta.get_column_by_name(name)
+            for name in self.list_fields.split(",")
+        ]
+        return [
+            self.table.exists().where(primary_key == row_id),
+            # The Select behind first()'s proxy, with its LIMIT 1
+            self.table.select(
+                *self.table._meta.columns, exclude_secrets=self.exclude_secrets
+            )
+            .where(primary_key == row_id)
+            .first()
+            .query,
+            self.table.select(*list_columns, exclude_secrets=self.exclude_secrets)
+            .order_by(primary_key, ascending=False)
+            .limit(self.page_size),
+        ]
+
+    async def get_all(
+        self, request: Request, params: t.Optional[t.Dict[str, t.Any]] = None
+    ) -> Response:
+        params = dict(params) if params else {}
+        fields = params.pop("fields", None)
+        if "__visible_fields" not in params:
+            params["__visible_fields"] = fields or self.list_fields
+        return await super().get_all(request, params=params)
+
+    async def get_batch(self, ids: t.List[str], max_ids: int) -> Response:
+        """
+        Fetches the reviews with the given ids in a single query. rows lines up with
+        ids, with null in place of any review that wasn't found, and not_found lists
+        those ids.
+        """
+        if len(ids) > max_ids:
+            return Response(
+                f"At most {max_ids} ids can be fetched at once", status_code=400
+            )
+        try:
+            row_ids = [uuid.UUID(row_id) for row_id in ids]
+        except ValueError:
+            return Response("ids must be UUIDs", status_code=400)
+
+        primary_key = self.table._meta.primary_key
+        rows = await self.table.select(
+            *self.table._meta.columns, exclude_secrets=self.exclude_secrets
+        ).where(
+            # One statement for any number of ids, unlike IN with a parameter per id
+            WhereRaw(
+                f'"{primary_key._meta.db_column_name}" = ANY({{}})', list(set(row_ids))
+            )
+        )
+        # Through the model, so rows are serialized like the other endpoints'
+        found = {
+            row[primary_key._meta.name]: self.pydantic_model_output(**row).model_dump(
+                mode="json"
+            )
+            for row in rows
+        }
+        return CustomJSONResponse(
+            dump_json(
+                {
+                    "rows": [found.get(row_id) for row_id in row_ids],
+                    "not_found": [
+                        str(row_id) for row_id in row_ids if row_id not in found
+                    ],
+                }
+            )
+        )
+
+    async def detail(self, request: Request) -> Response:
+        # Writes learn whether the row exists from the write itself
+        if request.method not in ("PUT", "PATCH", "DELETE"):
+            return await super().detail(request)
+
+        try:
+            row_id = self.table._meta.primary_key.value_type(
+                request.path_params["row_id"]
+            )
+        except ValueError:
+            return Response("The ID is invalid", status_code=400)
+
+        if request.method == "DELETE":
+            return await self.delete_single(request, row_id)
+        data = await request.json()
+        if request.method == "PUT":
+            return await self.put_single(request, row_id, data)
+        return await self.patch_single(request, row_id, data)
+
+    async def get_single(self, request: Request, row_id: uuid.UUID) -> Response:
+        response = await super().get_single(request, row_id)
+        if response.status_code == 200:
+            modified_on = json.loads(response.body).get("modified_on")
+            if modified_on:
+                response.headers["ETag"] = etag(parse_version(modified_on))
+        return response
+
+    def _where(
+        self, request: Request, row_id: uuid.UUID
+    ) -> t.Tuple[Combinable, t.Optional[datetime.datetime]]:
+        """The row a write applies to, narrowed to the If-Match version if given"""
+        where: Combinable = self.table._meta.primary_key == row_id
+        if_match = request.headers.get("if-match")
+        version = parse_if_match(if_match) if if_match else None
+        if version is not None:
+            where &= self.table._meta.get_column_by_name("modified_on") == version
+        return where, version
+
+    async def _not_written(
+        self, row_id: uuid.UUID, version: t.Optional[datetime.datetime]
+    ) -> Response:
+        # Only a conditional write that matched nothing needs a second query, to tell
+        # a changed review from a missing one
+        if version is not None and await self.table.exists().where(
+            self.table._meta.primary_key == row_id
+        ):
+            return Response("The resource has changed", status_code=412)
+        return Response("The resource doesn't exist", status_code=404)
+
+    async def _update(
+        self,
+        request: Request,
+        row_id: uuid.UUID,
+        values: t.Dict[t.Union[Column, str], t.Any],
+    ) -> Response:
+        try:
+            where, version = self._where(request, row_id)
+        except ValueError:
+            return Response("If-Match isn't a version of the resource", status_code=400)
+
+        # modified_on, the version, is moved on by the column's auto_update
+        rows = (
+            await self.table.update(values)
+            .where(where)
+            .returning(*self.table._meta.columns)
+        )
+        if not rows:
+            return await self._not_written(row_id, version)
+        return CustomJSONResponse(
+            self.pydantic_model(**rows[0]).model_dump_json(),
+            headers={"ETag": etag(rows[0]["modified_on"])},
+        )
+
+    def _values(
+        self, model: pydantic.BaseModel, data: t.Dict[str, t.Any]
+    ) -> t.Union[t.Dict[t.Union[Column, str], t.Any], Response]:
+        try:
+            return {getattr(self.table, key): getattr(model, key) for key in data}
+        except AttributeError:
+            unrecognised_keys = set(data) - set(model.model_dump())
+            return Response(
+                f"Unrecognised keys - {unrecognised_keys}.", status_code=400
+            )
+
+    @apply_validators
+    @db_exception_handler
+    async def put_single(
+        self, request: Request, row_id: uuid.UUID, data: t.Dict[str, t.Any]
+    ) -> Response:
+        try:
+            model = self.pydantic_model(**self._clean_data(data))
+        except pydantic.ValidationError as exception:
+            return Response(str(exception), status_code=400)
+
+        values = self._values(model, data)
+        if isinstance(values, Response):
+            return values
+        return await self._update(request, row_id, values)
+
+    @apply_validators
+    @db_exception_handler
+    async def patch_single(
+        self, request: Request, row_id: uuid.UUID, data: t.Dict[str, t.Any]
+    ) -> Response:
+        try:
+            model = self.pydantic_model_optional(**self._clean_data(data))
+        except pydantic.ValidationError as exception:
+            return Response(str(exception), status_code=400)
+
+        values = self._values(model, data)
+        if isinstance(values, Response):
+            return values
+        if self._hook_map:
+            values = await execute_patch_hooks(
+                hooks=self._hook_map,
+                hook_type=HookType.pre_patch,
+                row_id=row_id,
+                values=values,
+                request=request,
+            )
+        return await self._update(request, row_id, values)
+
+    @apply_validators
+    @db_exception_handler
+    async def delete_single(self, request: Request, row_id: uuid.UUID) -> Response:
+        try:
+            where, version = self._where(request, row_id)
+        except ValueError:
+            return Response("If-Match isn't a version of the resource", status_code=400)
+
+        if self._hook_map:
+            await execute_delete_hooks(
+                hooks=self._hook_map,
+                hook_type=HookType.pre_delete,
+                row_id=row_id,
+                request=request,
+            )
+        primary_key = self.table._meta.primary_key
+        if not await self.table.delete().where(where).returning(primary_key):
+            return await self._not_written(row_id, version)
+        return Response(status_code=204)
+
+    async def post_single(self, request: Request, data: t.Dict[str, t.Any]) -> Response:
+        if self.write_queue is None:
+            return await super().post_single(request, data)
+
+        try:
+            model = self.pydantic_model(**self._clean_data(data))
+        except pydantic.ValidationError as exception:
+            return Response(str(exception), status_code=400)
+
+        # The id and timestamps are final once the review is accepted, so a retried
+        # insert can't store it twice
+        row = await execute_post_hooks(
+            hooks=self._hook_map,
+            hook_type=HookType.pre_save,
+            row=Reviews(**model.model_dump()),
+            request=request,
+        )
+        try:
+            await self.write_queue.put(row)
+        except Exception:
+            log.exception("Unable to queue review, storing it now")
+            return await super().post_single(request, data)
+        return CustomJSONResponse(dump_json([{"id": row.id}]), status_code=202)
@@ -0,0 +1,184 @@
+"""
+Archival of old Reviews partitions
+
+Monthly partitions older than the retention period are detached from reviews, so no
+more reviews can be written to them, then exported to zstd compressed Parquet, either
+to a local directory or to S3 (an S3 compatible store such as MinIO works too, see
+ARCHIVE_S3_ENDPOINT_URL). If the export fails or the file's row count doesn't match
+the partition, the partition is attached again. Archived partitions are kept as plain
+tables unless drop is set, so they can still be re-attached with
+ALTER TABLE reviews ATTACH PARTITION.
+"""
+
+import asyncio
+import datetime
+import os
+import tempfile
+from typing import List, Optional, cast
+
+from db.partitions import (
+    LOCK_TIMEOUT,
+    TABLE,
+    add_months,
+    attached_partitions,
+    month_start,
+    partition_month,
+)
+from db.tables import Reviews
+from piccolo.engine.postgres import PostgresEngine
+
+# Where archives are written, a local directory or s3://bucket/prefix
+ARCHIVE_DESTINATION = os.getenv("ARCHIVE_DESTINATION", "archive")
+
+# Partitions whose month ended more than this many months ago are archived
+ARCHIVE_AFTER_MONTHS = int(os.getenv("ARCHIVE_AFTER_MONTHS", "12"))
+
+# Custom endpoint for an S3 compatible store, unset for AWS
+ARCHIVE_S3_ENDPOINT_URL = os.getenv("ARCHIVE_S3_ENDPOINT_URL") or None
+
+# Rows fetched from the cursor and written to the file at a time
+ARCHIVE_BATCH_SIZE = 10000
+
+
+def _schema():
+    # pyarrow is only imported by the archive job, the API process doesn't need it
+    import pyarrow as pa
+
+    return pa.schema(
+        [
+            ("id", pa.string()),
+            ("title", pa.string()),
+            ("rating", pa.int16()),
+            ("body", pa.string()),
+            ("created_on", pa.timestamp("us", tz="UTC")),
+            ("modified_on", pa.timestamp("us", tz="UTC")),
+        ]
+    )
+
+
+def archivable(
+    partitions: List[str], after_months: int, now: datetime.datetime
+) -> List[str]:
+    """Monthly partitions that ended at least after_months ago, oldest first"""
+    cutoff = add_months(month_start(now), -after_months)
+    return sorted(
+        name
+        for name in partitions
+        if (start := partition_month(name)) and add_months(start, 1) <= cutoff
+    )
+
+
+async def _export(connection, partition: str, path: str) -> int:
+    """Writes a partition to a Parquet file, returns the number of rows written"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = _schema()
+    rows = 0
+    with pq.ParquetWriter(path, schema, compression="zstd") as writer:
+        batch: List[dict] = []
+        async for record in connection.cursor(
+            f'SELECT * FROM "{partition}"', prefetch=ARCHIVE_BATCH_SIZE
+        ):
+            batch.append(dict(record, id=str(record["id"])))
+            if len(batch) == ARCHIVE_BATCH_SIZE:
+                writer.write_batch(pa.RecordBatch.from_pylist(batch, schema=schema))
+                rows += len(batch)
+                batch = []
+        if batch:
+            writer.write_batch(pa.RecordBatch.from_pylist(batch, schema=schema))
+            rows += len(batch)
+    return rows
+
+
+def _upload(path: str, destination: str, filename: str) -> str:
+    """Moves the exported file to its destination, returns where it ended up"""
+    if destination.startswith("s3://"):
+        import boto3
+
+        bucket, _, prefix = destination[len("s3://") :].partition("/")
+        key = "/".join(part for part in (prefix.strip("/"), filename) if part)
+        boto3.client("s3", endpoint_url=ARCHIVE_S3_ENDPOINT_URL).upload_file(
+            path, bucket, key
+        )
+        return f"s3://{bucket}/{key}"
+
+    os.makedirs(destination, exist_ok=True)
+    target = os.path.join(destination, filename)
+    os.replace(path, target)
+    return target
+
+
+async def archive_partition(
+    partition: str, destination: str = ARCHIVE_DESTINATION, drop: bool = False
+) -> str:
+    """Detaches, exports and verifies one partition, returns where it was archived"""
+    import pyarrow.parquet as pq
+
+    start = partition_month(partition)
+    if start is None:
+        raise ValueError(f"{partition} isn't a monthly partition of {TABLE}")
+
+    engine = cast(PostgresEngine, Reviews._meta.db)
+    connection = await engine.get_new_connection()
+    try:
+        # Detached first, so nothing can be written to the partition once the export
+        # has started
+        async with connection.transaction():
+            await connection.execute(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'")
+            await connection.execute(
+                f'ALTER TABLE "{TABLE}" DETACH PARTITION "{partition}"'
+            )
+
+        try:
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, f"{partition}.parquet")
+                # One snapshot for the export and the count they're checked against
+                async with connection.transaction(isolation="repeatable_read"):
+                    rows = await _export(connection, partition, path)
+                    expected = await connection.fetchval(
+                        f'SELECT count(*) FROM "{partition}"'
+                    )
+                written = pq.read_metadata(path).num_rows
+                if not rows == written == expected:
+                    raise RuntimeError(
+                        f"Archive of {partition} has {written} rows, "
+                        f"expected {expected}"
+                    )
+                location = await asyncio.to_thread(
+                    _upload, path, destination, f"{partition}.parquet"
+                )
+        except BaseException:
+            # Back where it was, rather than left detached without an archive
+            async with connection.transaction():
+                await connection.execute(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'")
+                await connection.execute(
+                    f'ALTER TABLE "{TABLE}" ATTACH PARTITION "{partition}" '
+                    f"FOR VALUES FROM ('{start.isoformat()}') "
+                    f"TO ('{add_months(start, 1).isoformat()}')"
+                )
+            raise
+
+        if drop:
+            await connection.execute(f'DROP TABLE "{partition}"')
+    finally:
+        await connection.close()
+    return location
+
+
+async def archive_partitions(
+    after_months: int = ARCHIVE_AFTER_MONTHS,
+    destination: str = ARCHIVE_DESTINATION,
+    drop: bool = False,
+    now: Optional[datetime.datetime] = None,
+) -> List[str]:
+    """Archives every partition older than after_months, returns where they went"""
+    partitions = archivable(
+        await attached_partitions(),
+        after_months,
+        now or datetime.datetime.now(datetime.timezone.utc),
+    )
+    return [
+        await archive_partition(partition, destination, drop)
+        for partition in partitions
+    ]
@@ -0,0 +1,62 @@
+"""
+Column types for the reviews tables
+"""
+
+import os
+import time
+import uuid
+from typing import Any, cast
+
+from piccolo.columns import UUID
+from piccolo.columns.defaults.base import Default
+
+
+def uuid7() -> uuid.UUID:
+    """
+    A UUIDv7 (RFC 9562): a millisecond Unix timestamp followed by random bits, so
+    ids sort in the order they were created and new rows are appended to the end of
+    the primary key index rather than scattered over it. The 12 bits after the
+    timestamp hold the sub-millisecond fraction, keeping ids from one process in
+    order within a millisecond too.
+    """
+    milliseconds, nanoseconds = divmod(time.time_ns(), 1_000_000)
+    fraction = nanoseconds * 4096 // 1_000_000
+    random = int.from_bytes(os.urandom(8), "big") & ((1 << 62) - 1)
+    return uuid.UUID(
+        int=milliseconds << 80 | 0x7 << 76 | fraction << 64 | 0b10 << 62 | random
+    )
+
+
+class UUID7(Default):
+    """
+    Defaults to a UUIDv7, from uuid7() in Python and uuid_generate_v7() in Postgres
+    (created by the 2026-10-19T11:00:00 migration)
+    """
+
+    @property
+    def postgres(self):
+        return "uuid_generate_v7()"
+
+    @property
+    def cockroach(self):
+        return self.postgres
+
+    @property
+    def sqlite(self):
+        return "''"
+
+    def python(self):
+        return uuid7()
+
+
+class TimeOrderedUUID(UUID):
+    """A UUID column defaulting to time ordered UUIDv7s rather than random UUIDv4s"""
+
+    def __init__(self, default: UUID7 = UUID7(), **kwargs) -> None:
+        self._validate_default(default, (UUID7,))
+        # UUID's signature only lists its own defaults, UUID7 is validated above
+        super().__init__(default=cast(Any, default), **kwargs)
+
+    @property
+    def column_type(self):
+        return "UUID"
@@ -0,0 +1,46 @@
+"""
+piccolo CLI commands for the reviews app, e.g. `piccolo reviews archive --drop=True`
+"""
+
+from db.archive import ARCHIVE_AFTER_MONTHS, ARCHIVE_DESTINATION, archive_partitions
+from db.indexes import ensure_indexes
+from db.partitions import PARTITION_MONTHS_AHEAD, ensure_partitions
+
+
+async def create_partitions(months_ahead: int = PARTITION_MONTHS_AHEAD):
+    """
+    Creates any missing monthly partitions of reviews.
+
+    :param months_ahead:
+        How many months past the current one to create partitions for.
+    """
+    created = await ensure_partitions(months_ahead)
+    print(f"Created {', '.join(created)}" if created else "Nothing to create")
+
+
+async def create_indexes():
+    """
+    Builds the indexes on reviews, one partition at a time without blocking writes.
+    """
+    built = await ensure_indexes()
+    print(f"Built {', '.join(built)}" if built else "Nothing to build")
+
+
+async def archive(
+    after_months: int = ARCHIVE_AFTER_MONTHS,
+    destination: str = ARCHIVE_DESTINATION,
+    drop: bool = False,
+):
+    """
+    Exports old partitions of reviews to Parquet and detaches them.
+
+    :param after_months:
+        Archive partitions whose month ended more than this many months ago.
+    :param destination:
+        A local directory, or s3://bucket/prefix.
+    :param drop:
+        Drop the partitions once they're archived, rather than keeping them as
+        standalone tables.
+    """
+    archived = await archive_partitions(after_months, destination, drop)
+    print(f"Archived to {', '.join(archived)}" if archived else "Nothing to archive")
@@ -0,0 +1,134 @@
+"""
+Postgres engine for the reviews service, instrumented for request logging and tracing.
+"""
+
+import asyncio
+import os
+import time
+from contextvars import ContextVar
+from typing import Any, List, Optional, Sequence
+
+from opentelemetry import trace
+from piccolo.engine.postgres import PostgresEngine
+from piccolo.query import Query
+from piccolo.querystring import QueryString
+
+# Seconds spent in the database by the current request. The request middleware sets
+# a fresh accumulator per request, queries outside a request aren't counted.
+db_time: ContextVar[Optional[List[float]]] = ContextVar("db_time", default=None)
+
+tracer = trace.get_tracer(__name__)
+
+# asyncpg pool bounds, the startup warm-up opens min_size connections
+POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "10"))
+POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+
+# Seconds before an idle pooled connection is closed, 0 keeps warmed connections open
+POOL_MAX_IDLE = float(os.getenv("DB_POOL_MAX_IDLE", "0"))
+
+# Seconds readiness waits on the warm-up before serving with whatever is warm
+WARMUP_TIMEOUT = float(os.getenv("DB_WARMUP_TIMEOUT", "20"))
+
+
+class PoolWaitTracker:
+    """
+    Exponentially weighted average of how long queries wait for a pooled connection.
+    The average only counts as current for `window` seconds after the last query, so
+    an idle process doesn't keep reporting an old backlog.
+    """
+
+    def __init__(self, alpha: float = 0.2, window: float = 5.0) -> None:
+        self.alpha = alpha
+        self.window = window
+        self.average = 0.0
+        self.last_observed = 0.0
+
+    def observe(self, seconds: float) -> None:
+        self.average += self.alpha * (seconds - self.average)
+        self.last_observed = time.monotonic()
+
+    def current(self) -> float:
+        if time.monotonic() - self.last_observed > self.window:
+            return 0.0
+        return self.average
+
+
+pool_wait = PoolWaitTracker()
+
+
+def _record(started: float) -> None:
+    accumulator = db_time.get()
+    if accumulator is not None:
+        accumulator[0] += time.perf_counter() - started
+
+
+class ReviewsEngine(PostgresEngine):
+    """
+    A PostgresEngine that records time spent running queries, and tracks how long
+    each query waits for a pooled connection.
+    """
+
+    async def _run_in_pool(self, query: str, args: Optional[Sequence[Any]] = None):
+        if args is None:
+            args = []
+        if not self.pool:
+            raise ValueError("A pool isn't currently running.")
+
+        with tracer.start_as_current_span("pool.acquire"):
+            started = time.perf_counter()
+            connection = await self.pool.acquire()
+            pool_wait.observe(time.perf_counter() - started)
+        try:
+            return await connection.fetch(query, *args)
+        finally:
+            await self.pool.release(connection)
+
+    async def warm_up(self, queries: Sequence[Query], size: int) -> None:
+        """
+        Opens `size` pooled connections and runs the queries on each, so the
+        connections are established and the statements are prepared and cached by
+        asyncpg before the first request needs them.
+        """
+        pool = self.pool
+        if not pool:
+            raise ValueError("A pool isn't currently running.")
+
+        statements = [
+            querystring.compile_string(engine_type=self.engine_type)
+            for query in queries
+            for querystring in query.querystrings
+        ]
+        warmed = 0
+        done = asyncio.Event()
+
+        async def warm_connection() -> None:
+            nonlocal warmed
+            # Every connection is held until all are warm, otherwise the pool would
+            # hand the same connection back out
+            async with pool.acquire() as connection:
+                try:
+                    for query, args in statements:
+                        await connection.fetch(query, *args)
+                except Exception:
+                    done.set()
+                    raise
+                warmed += 1
+                if warmed == size:
+                    done.set()
+                await done.wait()
+
+        await asyncio.gather(*(warm_connection() for _ in range(size)))
+
+    async def run_querystring(self, querystring: QueryString, in_pool: bool = True):
+        started = time.perf_counter()
+        try:
+            return await super().run_querystring(querystring, in_pool=in_pool)
+        finally:
+            _record(started)
+
+    async def run_ddl(self, ddl: str, in_pool: bool = True):
+        started = time.perf_counter()
+        try:
+            return await super().run_ddl(ddl, in_pool=in_pool)
+        finally:
+            _record(started)
@@ -0,0 +1,110 @@
+"""
+Indexes on reviews for the filters and orderings the CRUD endpoints generate
+
+- ?rating=N, ordered by the default -id: (rating, id)
+- ?rating=N&__order=-created_on: (rating, created_on)
+- ?__order=-created_on and created_on ranges: (created_on)
+
+Plain ?__order=-id uses the primary key.
+
+A CREATE INDEX on the partitioned reviews table would block writes for as long as it
+takes to build, and can't be built concurrently. Instead each partition's index is
+built with CREATE INDEX CONCURRENTLY, and attached to an index created ON ONLY
+reviews, which becomes valid once every partition's is attached. From then on
+partitions created later get the index too. This runs in the background at startup
+and with `piccolo reviews create_indexes`, it's a no-op once the indexes are valid.
+"""
+
+from typing import Dict, List, Optional, cast
+
+from asyncpg import Connection
+from db.partitions import LOCK_TIMEOUT, TABLE
+from db.tables import Reviews
+from piccolo.engine.postgres import PostgresEngine
+
+INDEXES: Dict[str, str] = {
+    f"{TABLE}_rating_id": '("rating", "id")',
+    f"{TABLE}_rating_created_on": '("rating", "created_on")',
+    f"{TABLE}_created_on": '("created_on")',
+}
+
+
+async def _valid(connection: Connection, index: str) -> Optional[bool]:
+    """Whether an index is valid, None if there's no such index"""
+    return await connection.fetchval(
+        "SELECT indisvalid FROM pg_index "
+        "WHERE indexrelid = to_regclass(quote_ident($1))",
+        index,
+    )
+
+
+async def _locking(connection: Connection, statement: str) -> None:
+    async with connection.transaction():
+        await connection.execute(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'")
+        await connection.execute(statement)
+
+
+async def ensure_indexes() -> List[str]:
+    """
+    Builds any missing or invalid indexes, and returns the names of the indexes on
+    reviews that were made valid. Returns straight away if another task is already
+    building them.
+    """
+    engine = cast(PostgresEngine, Reviews._meta.db)
+    # Its own connection, CREATE INDEX CONCURRENTLY can't run in a transaction
+    connection = await engine.get_new_connection()
+    try:
+        if not await connection.fetchval(
+            "SELECT pg_try_advisory_lock(hashtext($1))", f"{TABLE}_indexes"
+        ):
+            return []
+
+        built = []
+        for name, columns in INDEXES.items():
+            valid = await _valid(connection, name)
+            if valid:
+                continue
+
+            # Instant, no partition is indexed by it yet
+            await _locking(
+                connection,
+                f'CREATE INDEX IF NOT EXISTS "{name}" ON ONLY "{TABLE}" {columns}',
+            )
+            # Partitions with an index already attached, e.g. created since
+            indexed = {
+                row["partition"]
+                for row in await connection.fetch(
+                    "SELECT partition.relname AS partition FROM pg_inherits "
+                    "JOIN pg_index ON pg_index.indexrelid = pg_inherits.inhrelid "
+                    "JOIN pg_class partition ON partition.oid = pg_index.indrelid "
+                    "WHERE pg_inherits.inhparent = to_regclass(quote_ident($1))",
+                    name,
+                )
+            }
+            partitions = await connection.fetch(
+                "SELECT child.relname AS name FROM pg_inherits "
+                "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+                "WHERE pg_inherits.inhparent = to_regclass(quote_ident($1))",
+                TABLE,
+            )
+            for partition in (row["name"] for row in partitions):
+                if partition in indexed:
+                    continue
+                index = f"{partition}_{name[len(TABLE) + 1 :]}"
+                index_valid = await _valid(connection, index)
+                if index_valid is False:
+                    # Left behind by a build that was interrupted
+                    await connection.execute(f'DROP INDEX CONCURRENTLY "{index}"')
+                if not index_valid:
+                    await connection.execute(
+                        f'CREATE INDEX CONCURRENTLY "{index}" '
+                        f'ON "{partition}" {columns}'
+                    )
+                await _locking(
+                    connection, f'ALTER INDEX "{name}" ATTACH PARTITION "{index}"'
+                )
+            built.append(name)
+        return built
+    finally:
+        # Also releases the advisory lock
+        await connection.close()
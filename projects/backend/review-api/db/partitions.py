@@ -0,0 +1,114 @@
+"""
+Monthly partitions of the Reviews table
+
+reviews is range partitioned on created_on (see the 2026-10-19T10:00:00 migration),
+one partition per calendar month in UTC named reviews_pYYYY_MM. Rows outside every
+monthly partition land in reviews_default, so inserts never fail on a missing
+partition, but queries filtered on created_on can't skip the default partition's rows.
+Partitions are created ahead of time at startup and by `piccolo reviews
+create_partitions` to keep it empty, and any reviews dated in a month before its
+partition existed are moved over when it's created.
+"""
+
+import datetime
+import os
+import re
+from typing import List, Optional
+
+from db.tables import Reviews
+
+TABLE = Reviews._meta.tablename
+DEFAULT_PARTITION = f"{TABLE}_default"
+PARTITION_NAME = re.compile(rf"^{TABLE}_p(\d{{4}})_(\d{{2}})$")
+
+# Months of partitions kept ready past the current one
+PARTITION_MONTHS_AHEAD = int(os.getenv("PARTITION_MONTHS_AHEAD", "3"))
+
+# Maintenance that briefly locks reviews or one of its partitions (attaching, detaching,
+# indexing) gives up after this, rather than queue requests behind it
+LOCK_TIMEOUT = "5s"
+
+
+def month_start(value: datetime.datetime) -> datetime.datetime:
+    value = value.astimezone(datetime.timezone.utc)
+    return datetime.datetime(value.year, value.month, 1, tzinfo=datetime.timezone.utc)
+
+
+def add_months(start: datetime.datetime, months: int) -> datetime.datetime:
+    index = start.year * 12 + start.month - 1 + months
+    return start.replace(year=index // 12, month=index % 12 + 1)
+
+
+def partition_name(start: datetime.datetime) -> str:
+    return f"{TABLE}_p{start:%Y_%m}"
+
+
+def partition_month(name: str) -> Optional[datetime.datetime]:
+    """The first instant covered by a monthly partition, None for any other table"""
+    match = PARTITION_NAME.match(name)
+    if not match:
+        return None
+    year, month = (int(group) for group in match.groups())
+    return datetime.datetime(year, month, 1, tzinfo=datetime.timezone.utc)
+
+
+async def attached_partitions() -> List[str]:
+    rows = await Reviews.raw(
+        "SELECT child.relname AS name FROM pg_inherits "
+        "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+        "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+        "WHERE parent.relname = {} ORDER BY child.relname",
+        TABLE,
+    )
+    return [row["name"] for row in rows]
+
+
+async def create_partition(lower: datetime.datetime) -> bool:
+    """
+    Creates the partition for the month starting at lower, unless it's already there,
+    and returns whether it was created. Reviews dated in that month that landed in the
+    default partition are moved into the new one, which Postgres requires before it
+    can attach it.
+    """
+    name = partition_name(lower)
+    upper = add_months(lower, 1)
+    async with Reviews._meta.db.transaction():
+        # Serialises tasks starting at the same time, released on commit
+        await Reviews.raw("SELECT pg_advisory_xact_lock(hashtext({}))", TABLE)
+        if name in await attached_partitions():
+            return False
+        # Attaching locks the default partition anyway, taken up front so no review
+        # for the month can land in it between the move and the attach
+        await Reviews.raw(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'")
+        await Reviews.raw(f'LOCK TABLE "{DEFAULT_PARTITION}" IN ACCESS EXCLUSIVE MODE')
+        await Reviews.raw(f'CREATE TABLE "{name}" (LIKE "{TABLE}" INCLUDING DEFAULTS)')
+        await Reviews.raw(
+            f'WITH moved AS (DELETE FROM "{DEFAULT_PARTITION}" '
+            'WHERE "created_on" >= {} AND "created_on" < {} RETURNING *) '
+            f'INSERT INTO "{name}" SELECT * FROM moved',
+            lower,
+            upper,
+        )
+        await Reviews.raw(
+            f'ALTER TABLE "{TABLE}" ATTACH PARTITION "{name}" '
+            f"FOR VALUES FROM ('{lower.isoformat()}') TO ('{upper.isoformat()}')"
+        )
+    return True
+
+
+async def ensure_partitions(
+    months_ahead: int = PARTITION_MONTHS_AHEAD,
+    now: Optional[datetime.datetime] = None,
+) -> List[str]:
+    """
+    Creates any missing partitions from the current month to months_ahead, and returns
+    the names of those created. Each is created in its own transaction, so one month
+    failing doesn't undo the others. Safe to run concurrently from several tasks.
+    """
+    start = month_start(now or datetime.datetime.now(datetime.timezone.utc))
+    created = []
+    for month in range(months_ahead + 1):
+        lower = add_months(start, month)
+        if await create_partition(lower):
+            created.append(partition_name(lower))
+    return created
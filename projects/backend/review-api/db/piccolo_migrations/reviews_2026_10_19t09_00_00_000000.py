@@ -0,0 +1,169 @@
+from piccolo.apps.migrations.auto.migration_manager import MigrationManager
+from piccolo.columns.column_types import UUID, SmallInt, Text, Timestamptz
+from piccolo.columns.defaults.timestamptz import TimestamptzNow
+from piccolo.columns.defaults.uuid import UUID4
+from piccolo.columns.indexes import IndexMethod
+from piccolo.engine import engine_finder
+
+ID = "2026-10-19T09:00:00:000000"
+VERSION = "1.2.0"
+DESCRIPTION = "Create the reviews table"
+
+
+async def reviews_exists():
+    engine = engine_finder()
+    return (
+        await engine.run_ddl("SELECT to_regclass('reviews') IS NOT NULL AS \"exists\"")
+    )[0]["exists"]
+
+
+class CreateUnlessExists(MigrationManager):
+    """
+    Databases from before migrations were committed already have reviews, created by
+    the auto migration the container generated at startup. It's left as it is there,
+    and this migration is only recorded as applied.
+    """
+
+    async def run(self, backwards: bool = False):
+        if not backwards and not self.preview and await reviews_exists():
+            print(f"  - {self.migration_id} [reviews exists, skipped]... ", end="")
+            return
+        await super().run(backwards=backwards)
+
+
+async def forwards():
+    manager = CreateUnlessExists(
+        migration_id=ID, app_name="reviews", description=DESCRIPTION
+    )
+
+    manager.add_table(
+        class_name="Reviews", tablename="reviews", schema=None, columns=None
+    )
+
+    manager.add_column(
+        table_class_name="Reviews",
+        tablename="reviews",
+        column_name="id",
+        db_column_name="id",
+        column_class_name="UUID",
+        column_class=UUID,
+        params={
+            "default": UUID4(),
+            "null": False,
+            "primary_key": True,
+            "unique": False,
+            "index": False,
+            "index_method": IndexMethod.btree,
+            "choices": None,
+            "db_column_name": None,
+            "secret": False,
+        },
+        schema=None,
+    )
+
+    manager.add_column(
+        table_class_name="Reviews",
+        tablename="reviews",
+        column_name="title",
+        db_column_name="title",
+        column_class_name="Text",
+        column_class=Text,
+        params={
+            "default": "",
+            "null": False,
+            "primary_key": False,
+            "unique": False,
+            "index": False,
+            "index_method": IndexMethod.btree,
+            "choices": None,
+            "db_column_name": None,
+            "secret": False,
+        },
+        schema=None,
+    )
+
+    manager.add_column(
+        table_class_name="Reviews",
+        tablename="reviews",
+        column_name="rating",
+        db_column_name="rating",
+        column_class_name="SmallInt",
+        column_class=SmallInt,
+        params={
+            "default": 0,
+            "null": False,
+            "primary_key": False,
+            "unique": False,
+            "index": False,
+            "index_method": IndexMethod.btree,
+            "choices": None,
+            "db_column_name": None,
+            "secret": False,
+        },
+        schema=None,
+    )
+
+    manager.add_column(
+        table_class_name="Reviews",
+        tablename="reviews",
+        column_name="body",
+        db_column_name="body",
+        column_class_name="Text",
+        column_class=Text,
+        params={
+            "default": "",
+            "null": False,
+            "primary_key": False,
+            "unique": False,
+            "index": False,
+            "index_method": IndexMethod.btree,
+            "choices": None,
+            "db_column_name": None,
+            "secret": False,
+        },
+        schema=None,
+    )
+
+    manager.add_column(
+        table_class_name="Reviews",
+        tablename="reviews",
+        column_name="created_on",
+        db_column_name="created_on",
+        column_class_name="Timestamptz",
+        column_class=Timestamptz,
+        params={
+            "default": TimestamptzNow(),
+            "null": False,
+            "primary_key": False,
+            "unique": False,
+            "index": False,
+            "index_method": IndexMethod.btree,
+            "choices": None,
+            "db_column_name": None,
+            "secret": False,
+        },
+        schema=None,
+    )
+
+    manager.add_column(
+        table_class_name="Reviews",
+        tablename="reviews",
+        column_name="modified_on",
+        db_column_name="modified_on",
+        column_class_name="Timestamptz",
+        column_class=Timestamptz,
+        params={
+            "default": TimestamptzNow(),
+            "null": False,
+            "primary_key": False,
+            "unique": False,
+            "index": False,
+            "index_method": IndexMethod.btree,
+            "choices": None,
+            "db_column_name": None,
+            "secret": False,
+        },
+        schema=None,
+    )
+
+    return manager
@@ -0,0 +1,100 @@
+"""
+Converts reviews into a table range partitioned on created_on, with one partition per
+calendar month (UTC) and a default partition for anything outside them.
+
+Postgres can't partition an existing table in place, so the rows are copied into a new
+partitioned table in the same transaction. The primary key has to include the
+partition key, it becomes (id, created_on).
+"""
+
+import datetime
+
+from piccolo.apps.migrations.auto.migration_manager import MigrationManager
+from piccolo.engine import engine_finder
+
+ID = "2026-10-19T10:00:00:000000"
+VERSION = "1.2.0"
+DESCRIPTION = "Partition reviews by month of created_on"
+
+# Partitions created past the current month, db.partitions keeps this topped up
+MONTHS_AHEAD = 3
+
+COLUMNS = """
+    "id" UUID NOT NULL DEFAULT uuid_generate_v4(),
+    "title" TEXT NOT NULL DEFAULT '',
+    "rating" SMALLINT NOT NULL DEFAULT 0,
+    "body" TEXT NOT NULL DEFAULT '',
+    "created_on" TIMESTAMPTZ NOT NULL DEFAULT current_timestamp,
+    "modified_on" TIMESTAMPTZ NOT NULL DEFAULT current_timestamp
+"""
+
+
+def _month_start(value: datetime.datetime) -> datetime.datetime:
+    value = value.astimezone(datetime.timezone.utc)
+    return datetime.datetime(value.year, value.month, 1, tzinfo=datetime.timezone.utc)
+
+
+def _next_month(start: datetime.datetime) -> datetime.datetime:
+    return start.replace(
+        year=start.year + start.month // 12, month=start.month % 12 + 1
+    )
+
+
+async def partition():
+    engine = engine_finder()
+    await engine.run_ddl('ALTER TABLE "reviews" RENAME TO "reviews_unpartitioned"')
+    await engine.run_ddl(
+        'ALTER TABLE "reviews_unpartitioned" '
+        'RENAME CONSTRAINT "reviews_pkey" TO "reviews_unpartitioned_pkey"'
+    )
+    await engine.run_ddl(
+        f'CREATE TABLE "reviews" ({COLUMNS}, PRIMARY KEY ("id", "created_on")) '
+        'PARTITION BY RANGE ("created_on")'
+    )
+    await engine.run_ddl(
+        'CREATE TABLE "reviews_default" PARTITION OF "reviews" DEFAULT'
+    )
+
+    # Monthly partitions from the oldest existing review to a few months ahead
+    now = datetime.datetime.now(datetime.timezone.utc)
+    oldest = (
+        await engine.run_ddl(
+            'SELECT min("created_on") AS "oldest" FROM "reviews_unpartitioned"'
+        )
+    )[0]["oldest"]
+    start = _month_start(min(oldest or now, now))
+    end = _month_start(now)
+    for _ in range(MONTHS_AHEAD + 1):
+        end = _next_month(end)
+    while start < end:
+        await engine.run_ddl(
+            f'CREATE TABLE "reviews_p{start:%Y_%m}" PARTITION OF "reviews" '
+            f"FOR VALUES FROM ('{start.isoformat()}') "
+            f"TO ('{_next_month(start).isoformat()}')"
+        )
+        start = _next_month(start)
+
+    await engine.run_ddl('INSERT INTO "reviews" SELECT * FROM "reviews_unpartitioned"')
+    await engine.run_ddl('DROP TABLE "reviews_unpartitioned"')
+
+
+async def unpartition():
+    engine = engine_finder()
+    await engine.run_ddl('ALTER TABLE "reviews" RENAME TO "reviews_partitioned"')
+    await engine.run_ddl(
+        'ALTER TABLE "reviews_partitioned" '
+        'RENAME CONSTRAINT "reviews_pkey" TO "reviews_partitioned_pkey"'
+    )
+    await engine.run_ddl(f'CREATE TABLE "reviews" ({COLUMNS}, PRIMARY KEY ("id"))')
+    await engine.run_ddl('INSERT INTO "reviews" SELECT * FROM "reviews_partitioned"')
+    # Drops every partition still attached, archived ones are already gone
+    await engine.run_ddl('DROP TABLE "reviews_partitioned"')
+
+
+async def forwards():
+    manager = MigrationManager(
+        migration_id=ID, app_name="reviews", description=DESCRIPTION
+    )
+    manager.add_raw(partition)
+    manager.add_raw_backwards(unpartition)
+    return manager
@@ -0,0 +1,71 @@
+"""
+Switches new review ids to time ordered UUIDv7s.
+
+The indexes for the CRUD endpoints' filters aren't created here: migrations run in a
+transaction at container start, and building them on reviews would block writes for as
+long as the build takes. See db/indexes.py.
+"""
+
+from db.columns import UUID7, TimeOrderedUUID
+from piccolo.apps.migrations.auto.migration_manager import MigrationManager
+from piccolo.columns.column_types import UUID
+from piccolo.columns.defaults.uuid import UUID4
+from piccolo.engine import engine_finder
+
+ID = "2026-10-19T11:00:00:000000"
+VERSION = "1.2.0"
+DESCRIPTION = "Time ordered ids"
+
+
+async def create_uuid7_function():
+    engine = engine_finder()
+    # Postgres 17 and earlier don't have a UUIDv7 function, this matches db.columns.uuid7
+    # at millisecond precision: a v4 with the first 48 bits replaced by the timestamp
+    # and the version bits flipped from 4 to 7
+    await engine.run_ddl(
+        """
+        CREATE OR REPLACE FUNCTION uuid_generate_v7() RETURNS uuid AS $$
+            SELECT encode(
+                set_bit(
+                    set_bit(
+                        overlay(
+                            uuid_send(gen_random_uuid())
+                            PLACING substring(
+                                int8send(
+                                    floor(
+                                        extract(epoch FROM clock_timestamp()) * 1000
+                                    )::bigint
+                                ) FROM 3
+                            )
+                            FROM 1 FOR 6
+                        ),
+                        52, 1
+                    ),
+                    53, 1
+                ),
+                'hex'
+            )::uuid
+        $$ LANGUAGE sql VOLATILE
+        """
+    )
+
+
+async def forwards():
+    manager = MigrationManager(
+        migration_id=ID, app_name="reviews", description=DESCRIPTION
+    )
+    manager.add_raw(create_uuid7_function)
+
+    manager.alter_column(
+        table_class_name="Reviews",
+        tablename="reviews",
+        column_name="id",
+        db_column_name="id",
+        params={"default": UUID7()},
+        old_params={"default": UUID4()},
+        column_class=TimeOrderedUUID,
+        old_column_class=UUID,
+        schema=None,
+    )
+
+    return manager
@@ -5,7 +5,8 @@ the APP_CONFIG.
 
 import os
 
-from piccolo.conf.apps import AppConfig, table_finder
+from db.commands import archive, create_indexes, create_partitions
+from piccolo.conf.apps import AppConfig, Command, table_finder
 
 CURRENT_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
 
@@ -15,5 +16,5 @@ APP_CONFIG = AppConfig(
     migrations_folder_path=os.path.join(CURRENT_DIRECTORY, "piccolo_migrations"),
     table_classes=table_finder(modules=["db.tables"], exclude_imported=True),
     migration_dependencies=[],
-    commands=[],
+    commands=[Command(create_partitions), Command(create_indexes), Command(archive)],
 )
@@ -1,17 +1,26 @@
 import datetime
 
-from piccolo.columns import UUID, SmallInt, Text, Timestamptz
+from db.columns import TimeOrderedUUID
+from piccolo.columns import SmallInt, Text, Timestamptz
 from piccolo.table import Table
 
 
+def utc_now() -> datetime.datetime:
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
 class Reviews(Table):
     """
     Reviews table for reviews-api service
+
+    Partitioned by month of created_on (see the migrations in db/piccolo_migrations),
+    and indexed for the CRUD endpoints' filters and orderings (see db/indexes.py).
     """
 
-    id = UUID(primary_key=True)
+    id = TimeOrderedUUID(primary_key=True)
     title = Text(required=True)
     rating = SmallInt(required=True)
     body = Text()
     created_on = Timestamptz(default=datetime.datetime.now)
-    modified_on = Timestamptz(auto_update=datetime.datetime.now)
+    # Set by every update, which also makes it the review's version (see crud.py)
+    modified_on = Timestamptz(auto_update=utc_now)
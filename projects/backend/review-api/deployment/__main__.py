@@ -3,12 +3,14 @@ reviews_api
 
 Creates ECS tasks and services for a basic CRUD reviews service
 """
+import fnmatch
+import hashlib
 import json
 import os
 
 import pulumi
 import pulumi_aws as aws
-import pulumi_awsx as awsx
+import pulumi_docker_build as docker_build
 
 # ---------------------------------------------------------------------------------------
 # Project config
@@ -30,9 +32,14 @@ ecs = pulumi.StackReference(f"{os.getenv('ORG_NAME')}/ecs/{STACK}")
 cluster_arn = ecs.require_output("cluster_arn")
 task_shared_security_group_id = ecs.require_output("task_shared_security_group_id")
 task_shared_execution_role_arn = ecs.require_output("task_shared_execution_role_arn")
+fargate_base = ecs.require_output("fargate_base")
+fargate_weight = ecs.require_output("fargate_weight")
+fargate_spot_weight = ecs.require_output("fargate_spot_weight")
 
 load_balancer = pulumi.StackReference(f"{os.getenv('ORG_NAME')}/load_balancer/{STACK}")
 https_listener_arn = load_balancer.require_output("https_listener_arn")
+cloudfront_distribution_id = load_balancer.get_output("cloudfront_distribution_id")
+cloudfront_distribution_arn = load_balancer.get_output("cloudfront_distribution_arn")
 
 aurora = pulumi.StackReference(f"{os.getenv('ORG_NAME')}/aurora/{STACK}")
 db_credentials_secret_arn = aurora.require_output(
@@ -41,45 +48,347 @@ db_credentials_secret_arn = aurora.require_output(
 
 # Environment specific config
 CONFIG = pulumi.Config()
+cache_max_age = CONFIG.require_int("cache_max_age")
+cache_s_maxage = CONFIG.require_int("cache_s_maxage")
+log_level = CONFIG.require("log_level")
+access_log_sample_rate = CONFIG.require_float("access_log_sample_rate")
+tracing_enabled = CONFIG.require_bool("tracing_enabled")
+trace_sample_ratio = CONFIG.require_float("trace_sample_ratio")
+coalesce_max_wait = CONFIG.require_float("coalesce_max_wait")
+db_pool_min_size = CONFIG.require_int("db_pool_min_size")
+db_pool_max_size = CONFIG.require_int("db_pool_max_size")
+db_pool_max_idle = CONFIG.require_float("db_pool_max_idle")
+db_warmup_timeout = CONFIG.require_float("db_warmup_timeout")
+admission_max_queue = CONFIG.require_int("admission_max_queue")
+admission_max_queue_wait = CONFIG.require_float("admission_max_queue_wait")
+admission_max_pool_wait = CONFIG.require_float("admission_max_pool_wait")
+rate_limit_per_second = CONFIG.require_float("rate_limit_per_second")
+rate_limit_burst = CONFIG.require_int("rate_limit_burst")
+compression_min_size = CONFIG.require_int("compression_min_size")
+partition_months_ahead = CONFIG.require_int("partition_months_ahead")
+archive_after_months = CONFIG.require_int("archive_after_months")
+archive_schedule = CONFIG.require("archive_schedule")
+write_behind_enabled = CONFIG.require_bool("write_behind_enabled")
+write_behind_workers = CONFIG.require_int("write_behind_workers")
+write_behind_batch_size = CONFIG.require_int("write_behind_batch_size")
+write_behind_max_attempts = CONFIG.require_int("write_behind_max_attempts")
+service_desired_count = CONFIG.require_int("service_desired_count")
+deployment_minimum_healthy_percent = CONFIG.require_int(
+    "deployment_minimum_healthy_percent"
+)
+deployment_maximum_percent = CONFIG.require_int("deployment_maximum_percent")
+deployment_rollback = CONFIG.require_bool("deployment_rollback")
+health_check_grace_period = CONFIG.require_int("health_check_grace_period")
+health_check_interval = CONFIG.require_int("health_check_interval")
+health_check_timeout = CONFIG.require_int("health_check_timeout")
+health_check_healthy_threshold = CONFIG.require_int("health_check_healthy_threshold")
+health_check_unhealthy_threshold = CONFIG.require_int(
+    "health_check_unhealthy_threshold"
+)
+deregistration_delay = CONFIG.require_int("deregistration_delay")
+shutdown_drain = CONFIG.require_float("shutdown_drain")
+shutdown_timeout = CONFIG.require_int("shutdown_timeout")
+batch_get_max_ids = CONFIG.require_int("batch_get_max_ids")
+batch_post_max_ids = CONFIG.require_int("batch_post_max_ids")
+
+# AWS Distro for OpenTelemetry collector, receives OTLP from the app and forwards to X-Ray
+# https://aws-otel.github.io/docs/setup/ecs
+ADOT_COLLECTOR_IMAGE = "public.ecr.aws/aws-observability/aws-otel-collector:v0.40.0"
+
+# Seconds between SIGTERM and SIGKILL, the most Fargate allows and the length of the Spot
+# interruption notice. The app drains within it, see server.py.
+APP_STOP_TIMEOUT = 120
 
 # ---------------------------------------------------------------------------------------
 # ECR
 # https://www.pulumi.com/registry/packages/aws/api-docs/ecr/
 # ---------------------------------------------------------------------------------------
+# App images are tagged with a hash of their build inputs, see content_tag
+APP_IMAGE_CONTEXT = "../"
+APP_IMAGE_TAG_PREFIX = "src-"
+APP_IMAGE_CACHE_TAG = "build-cache"
+
 # Create repo
 image_repo = aws.ecr.Repository("repo", force_delete=True)
 
-# Add lifecycle policies to each repo
+# Add lifecycle policies to each repo. Only app images count towards the last 3, the
+# build cache tag is kept and the caches it replaces expire once untagged.
 aws.ecr.LifecyclePolicy(
     "repo-lifecycle-policy",
     repository=image_repo.name,
-    policy="""{
-    "rules": [
+    policy=json.dumps(
         {
-            "rulePriority": 1,
-            "description": "Keep only the last 3 images",
-            "selection": {
-                "tagStatus": "any",
-                "countType": "imageCountMoreThan",
-                "countNumber": 3
-            },
-            "action": {
-                "type": "expire"
-            }
+            "rules": [
+                {
+                    "rulePriority": 1,
+                    "description": "Keep only the last 3 images",
+                    "selection": {
+                        "tagStatus": "tagged",
+                        "tagPrefixList": [APP_IMAGE_TAG_PREFIX],
+                        "countType": "imageCountMoreThan",
+                        "countNumber": 3,
+                    },
+                    "action": {"type": "expire"},
+                },
+                {
+                    "rulePriority": 2,
+                    "description": "Expire replaced build caches",
+                    "selection": {
+                        "tagStatus": "untagged",
+                        "countType": "sinceImagePushed",
+                        "countUnit": "days",
+                        "countNumber": 1,
+                    },
+                    "action": {"type": "expire"},
+                },
+            ]
         }
-    ]
-}
-""",
+    ),
 )
 
+
 # App image
-app_image = awsx.ecr.Image(
+def content_tag(context: str) -> str:
+    """
+    Hashes every file in the build context, so the tag only changes when the
+    Dockerfile, lockfile or source do. Files excluded by .dockerignore aren't part of
+    the image and aren't hashed.
+    """
+    with open(os.path.join(context, ".dockerignore")) as dockerignore:
+        ignored = [
+            line.strip()
+            for line in dockerignore
+            if line.strip() and not line.startswith("#")
+        ]
+
+    def is_ignored(path: str) -> bool:
+        parts = path.split("/")
+        return any(
+            fnmatch.fnmatch("/".join(parts[: end + 1]), pattern)
+            or pattern.startswith("**/")
+            and fnmatch.fnmatch(parts[end], pattern[len("**/") :])
+            for end in range(len(parts))
+            for pattern in ignored
+        )
+
+    digest = hashlib.sha256()
+    for root, directories, files in os.walk(context):
+        directories.sort()
+        for name in sorted(files):
+            path = os.path.relpath(os.path.join(root, name), context)
+            if is_ignored(path):
+                continue
+            digest.update(path.encode() + b"\0")
+            with open(os.path.join(root, name), "rb") as file:
+                digest.update(hashlib.sha256(file.read()).digest())
+    return APP_IMAGE_TAG_PREFIX + digest.hexdigest()[:16]
+
+
+# Built when the content tag changes, otherwise docker-build finds nothing to update.
+# Builds reuse the layers cached in the registry by earlier builds.
+app_image_tag = content_tag(APP_IMAGE_CONTEXT)
+app_image_cache = image_repo.repository_url.apply(
+    lambda url: f"{url}:{APP_IMAGE_CACHE_TAG}"
+)
+registry_credentials = aws.ecr.get_authorization_token_output(
+    registry_id=image_repo.registry_id
+)
+app_image = docker_build.Image(
     "app-image",
-    repository_url=image_repo.repository_url,
-    context="../",
-    platform="linux/amd64",
+    tags=[image_repo.repository_url.apply(lambda url: f"{url}:{app_image_tag}")],
+    context=docker_build.BuildContextArgs(location=APP_IMAGE_CONTEXT),
+    platforms=[docker_build.Platform.LINUX_AMD64],
+    push=True,
+    # Previews would otherwise build every changed image without pushing it
+    build_on_preview=False,
+    registries=[
+        docker_build.RegistryArgs(
+            address=image_repo.repository_url,
+            username=registry_credentials.user_name,
+            password=pulumi.Output.secret(registry_credentials.password),
+        )
+    ],
+    cache_from=[
+        docker_build.CacheFromArgs(
+            registry=docker_build.CacheFromRegistryArgs(ref=app_image_cache)
+        )
+    ],
+    # ECR only accepts cache manifests in the OCI image manifest format
+    cache_to=[
+        docker_build.CacheToArgs(
+            registry=docker_build.CacheToRegistryArgs(
+                ref=app_image_cache,
+                mode=docker_build.CacheMode.MAX,
+                image_manifest=True,
+                oci_media_types=True,
+            )
+        )
+    ],
+)
+app_image_uri = pulumi.Output.concat(
+    image_repo.repository_url, ":", app_image_tag, "@", app_image.digest
+)
+
+# ---------------------------------------------------------------------------------------
+# Archive bucket
+# Old Reviews partitions exported to Parquet by the archive job, see db/archive.py
+# https://www.pulumi.com/registry/packages/aws/api-docs/s3/bucketv2/
+# ---------------------------------------------------------------------------------------
+archive_bucket = aws.s3.BucketV2("archive-bucket", tags=TAGS)
+
+aws.s3.BucketPublicAccessBlock(
+    "archive-bucket-public-access-block",
+    bucket=archive_bucket.id,
+    block_public_acls=True,
+    block_public_policy=True,
+    ignore_public_acls=True,
+    restrict_public_buckets=True,
+)
+
+# ---------------------------------------------------------------------------------------
+# Write-behind queue
+# Accepted reviews waiting to be stored when write_behind_enabled, see ingest.py
+# https://www.pulumi.com/registry/packages/aws/api-docs/sqs/queue/
+# ---------------------------------------------------------------------------------------
+write_behind_dead_letter_queue = aws.sqs.Queue(
+    "write-behind-dead-letter-queue",
+    message_retention_seconds=14 * 24 * 60 * 60,
+    sqs_managed_sse_enabled=True,
+    tags=TAGS,
+)
+
+write_behind_queue = aws.sqs.Queue(
+    "write-behind-queue",
+    message_retention_seconds=4 * 24 * 60 * 60,
+    # Matches ingest.VISIBILITY_TIMEOUT
+    visibility_timeout_seconds=30,
+    sqs_managed_sse_enabled=True,
+    # The app dead-letters after write_behind_max_attempts, SQS only moves messages
+    # that keep failing without the app getting that far, e.g. ones that crash it
+    redrive_policy=write_behind_dead_letter_queue.arn.apply(
+        lambda arn: json.dumps(
+            {
+                "deadLetterTargetArn": arn,
+                "maxReceiveCount": write_behind_max_attempts + 5,
+            }
+        )
+    ),
+    tags=TAGS,
 )
 
+# ---------------------------------------------------------------------------------------
+# Task role
+# Permissions for the running app itself, e.g. purging the edge cache after writes
+# ---------------------------------------------------------------------------------------
+task_role = aws.iam.Role(
+    "task-role",
+    assume_role_policy=json.dumps(
+        {
+            "Version": "2012-10-17",
+            "Statement": [
+                {
+                    "Sid": "TaskAssumeRole",
+                    "Effect": "Allow",
+                    "Principal": {"Service": "ecs-tasks.amazonaws.com"},
+                    "Action": "sts:AssumeRole",
+                }
+            ],
+        }
+    ),
+    inline_policies=pulumi.Output.all(
+        cloudfront_distribution_arn,
+        archive_bucket.arn,
+        write_behind_queue.arn,
+        write_behind_dead_letter_queue.arn,
+    ).apply(
+        lambda args: (
+            [
+                aws.iam.RoleInlinePolicyArgs(
+                    name="invalidate-cache",
+                    policy=json.dumps(
+                        {
+                            "Version": "2012-10-17",
+                            "Statement": [
+                                {
+                                    "Action": ["cloudfront:CreateInvalidation"],
+                                    "Effect": "Allow",
+                                    "Resource": args[0],
+                                }
+                            ],
+                        }
+                    ),
+                )
+            ]
+            if args[0]
+            else []
+        )
+        + [
+            aws.iam.RoleInlinePolicyArgs(
+                name="write-archive",
+                policy=json.dumps(
+                    {
+                        "Version": "2012-10-17",
+                        "Statement": [
+                            {
+                                "Action": ["s3:PutObject"],
+                                "Effect": "Allow",
+                                "Resource": f"{args[1]}/*",
+                            }
+                        ],
+                    }
+                ),
+            ),
+            aws.iam.RoleInlinePolicyArgs(
+                name="write-behind-queue",
+                policy=json.dumps(
+                    {
+                        "Version": "2012-10-17",
+                        "Statement": [
+                            {
+                                "Action": [
+                                    "sqs:SendMessage",
+                                    "sqs:ReceiveMessage",
+                                    "sqs:DeleteMessage",
+                                    "sqs:ChangeMessageVisibility",
+                                    "sqs:GetQueueAttributes",
+                                ],
+                                "Effect": "Allow",
+                                "Resource": args[2],
+                            },
+                            {
+                                "Action": ["sqs:SendMessage"],
+                                "Effect": "Allow",
+                                "Resource": args[3],
+                            },
+                        ],
+                    }
+                ),
+            ),
+        ]
+    ),
+    managed_policy_arns=["arn:aws:iam::aws:policy/AWSXRayDaemonWriteAccess"]
+    if tracing_enabled
+    else [],
+    tags=TAGS,
+)
+
+# Collector sidecar, only added when tracing is enabled
+adot_collector_container = {
+    "name": "aws-otel-collector",
+    "image": ADOT_COLLECTOR_IMAGE,
+    "essential": False,
+    "command": ["--config=/etc/ecs/ecs-default-config.yaml"],
+    "logConfiguration": {
+        "logDriver": "awslogs",
+        "options": {
+            "awslogs-group": f"/ecs/{PROJECT_NAME}",
+            "awslogs-region": AWS_REGION,
+            "awslogs-stream-prefix": "otel",
+            "awslogs-create-group": "true",
+        },
+    },
+}
+
 # ---------------------------------------------------------------------------------------
 # ECS task definition
 # https://www.pulumi.com/registry/packages/aws/api-docs/ecs/taskdefinition/
@@ -87,7 +396,12 @@ app_image = awsx.ecr.Image(
 task_definition = aws.ecs.TaskDefinition(
     "task-definition",
     container_definitions=pulumi.Output.all(
-        app_image.image_uri, db_credentials_secret_arn
+        app_image_uri,
+        db_credentials_secret_arn,
+        cloudfront_distribution_id,
+        archive_bucket.bucket,
+        write_behind_queue.url,
+        write_behind_dead_letter_queue.url,
     ).apply(
         lambda args: json.dumps(
             [
@@ -95,6 +409,7 @@ task_definition = aws.ecs.TaskDefinition(
                     "name": PROJECT_NAME,
                     "image": args[0],
                     "essential": True,
+                    "stopTimeout": APP_STOP_TIMEOUT,
                     "logConfiguration": {
                         "logDriver": "awslogs",
                         "options": {
@@ -104,6 +419,90 @@ task_definition = aws.ecs.TaskDefinition(
                             "awslogs-create-group": "true",
                         },
                     },
+                    "environment": [
+                        {"name": "CACHE_MAX_AGE", "value": str(cache_max_age)},
+                        {"name": "CACHE_S_MAXAGE", "value": str(cache_s_maxage)},
+                        {"name": "LOG_LEVEL", "value": log_level},
+                        {
+                            "name": "ACCESS_LOG_SAMPLE_RATE",
+                            "value": str(access_log_sample_rate),
+                        },
+                        {
+                            "name": "TRACING_ENABLED",
+                            "value": str(tracing_enabled).lower(),
+                        },
+                        {
+                            "name": "TRACE_SAMPLE_RATIO",
+                            "value": str(trace_sample_ratio),
+                        },
+                        {"name": "OTEL_SERVICE_NAME", "value": PROJECT_NAME},
+                        {"name": "COALESCE_MAX_WAIT", "value": str(coalesce_max_wait)},
+                        {"name": "DB_POOL_MIN_SIZE", "value": str(db_pool_min_size)},
+                        {"name": "DB_POOL_MAX_SIZE", "value": str(db_pool_max_size)},
+                        {"name": "DB_POOL_MAX_IDLE", "value": str(db_pool_max_idle)},
+                        {"name": "DB_WARMUP_TIMEOUT", "value": str(db_warmup_timeout)},
+                        {
+                            "name": "ADMISSION_MAX_QUEUE",
+                            "value": str(admission_max_queue),
+                        },
+                        {
+                            "name": "ADMISSION_MAX_QUEUE_WAIT",
+                            "value": str(admission_max_queue_wait),
+                        },
+                        {
+                            "name": "ADMISSION_MAX_POOL_WAIT",
+                            "value": str(admission_max_pool_wait),
+                        },
+                        {
+                            "name": "RATE_LIMIT_PER_SECOND",
+                            "value": str(rate_limit_per_second),
+                        },
+                        {"name": "RATE_LIMIT_BURST", "value": str(rate_limit_burst)},
+                        {
+                            "name": "COMPRESSION_MIN_SIZE",
+                            "value": str(compression_min_size),
+                        },
+                        {"name": "CLOUDFRONT_DISTRIBUTION_ID", "value": args[2] or ""},
+                        # CloudFront appends to X-Forwarded-For ahead of the load balancer
+                        {"name": "PROXY_HOPS", "value": "1" if args[2] else "0"},
+                        {
+                            "name": "PARTITION_MONTHS_AHEAD",
+                            "value": str(partition_months_ahead),
+                        },
+                        {
+                            "name": "ARCHIVE_AFTER_MONTHS",
+                            "value": str(archive_after_months),
+                        },
+                        {"name": "ARCHIVE_DESTINATION", "value": f"s3://{args[3]}"},
+                        {
+                            "name": "WRITE_BEHIND",
+                            "value": str(write_behind_enabled).lower(),
+                        },
+                        {"name": "WRITE_BEHIND_QUEUE_URL", "value": args[4]},
+                        {
+                            "name": "WRITE_BEHIND_DEAD_LETTER_QUEUE_URL",
+                            "value": args[5],
+                        },
+                        {
+                            "name": "WRITE_BEHIND_WORKERS",
+                            "value": str(write_behind_workers),
+                        },
+                        {
+                            "name": "WRITE_BEHIND_BATCH_SIZE",
+                            "value": str(write_behind_batch_size),
+                        },
+                        {
+                            "name": "WRITE_BEHIND_MAX_ATTEMPTS",
+                            "value": str(write_behind_max_attempts),
+                        },
+                        {"name": "SHUTDOWN_DRAIN", "value": str(shutdown_drain)},
+                        {"name": "SHUTDOWN_TIMEOUT", "value": str(shutdown_timeout)},
+                        {"name": "BATCH_GET_MAX_IDS", "value": str(batch_get_max_ids)},
+                        {
+                            "name": "BATCH_POST_MAX_IDS",
+                            "value": str(batch_post_max_ids),
+                        },
+                    ],
                     "secrets": [
                         {
                             "valueFrom": args[1],
@@ -111,13 +510,20 @@ task_definition = aws.ecs.TaskDefinition(
                         }
                     ],
                     "portMappings": [{"containerPort": 80, "protocol": "tcp"}],
+                    "dependsOn": [
+                        {"containerName": "aws-otel-collector", "condition": "START"}
+                    ]
+                    if tracing_enabled
+                    else [],
                 }
             ]
+            + ([adot_collector_container] if tracing_enabled else [])
         )
     ),
     cpu=256,
     memory=512,
     execution_role_arn=task_shared_execution_role_arn,
+    task_role_arn=task_role.arn,
     family="reviews_api",
     network_mode="awsvpc",
     requires_compatibilities=["FARGATE"],
@@ -128,14 +534,22 @@ task_definition = aws.ecs.TaskDefinition(
 )
 
 # primary target group
+# A new task takes health_check_healthy_threshold checks to start receiving traffic, and
+# old tasks drain for deregistration_delay, see deployment/README.md for rollout times
 target_group = aws.lb.TargetGroup(
     "service-load-balancer-tg",
     protocol="HTTP",
     target_type="ip",
     vpc_id=vpc_id,
     port=80,
+    deregistration_delay=deregistration_delay,
     health_check=aws.lb.TargetGroupHealthCheckArgs(
-        matcher="200-302", interval=300, path="/review/health"
+        matcher="200-302",
+        path="/review/health",
+        interval=health_check_interval,
+        timeout=health_check_timeout,
+        healthy_threshold=health_check_healthy_threshold,
+        unhealthy_threshold=health_check_unhealthy_threshold,
     ),
     opts=pulumi.ResourceOptions(parent=load_balancer),
 )
@@ -168,9 +582,30 @@ service = aws.ecs.Service(
     name=PROJECT_NAME,
     cluster=cluster_arn,
     task_definition=task_definition.arn,
-    desired_count=1,
-    launch_type="FARGATE",
-    health_check_grace_period_seconds=60,
+    desired_count=service_desired_count,
+    # The cluster's split between FARGATE and FARGATE_SPOT. Spot tasks get SIGTERM two
+    # minutes before they're reclaimed, see APP_STOP_TIMEOUT.
+    capacity_provider_strategies=[
+        aws.ecs.ServiceCapacityProviderStrategyArgs(
+            capacity_provider="FARGATE",
+            base=fargate_base,
+            weight=fargate_weight,
+        ),
+        aws.ecs.ServiceCapacityProviderStrategyArgs(
+            capacity_provider="FARGATE_SPOT",
+            weight=fargate_spot_weight,
+        ),
+    ],
+    # Long enough for the container to start and warm up before failed health checks
+    # count against it
+    health_check_grace_period_seconds=health_check_grace_period,
+    deployment_minimum_healthy_percent=deployment_minimum_healthy_percent,
+    deployment_maximum_percent=deployment_maximum_percent,
+    # Stops a deployment whose tasks keep failing, and rolls back to the last one that
+    # reached a steady state
+    deployment_circuit_breaker=aws.ecs.ServiceDeploymentCircuitBreakerArgs(
+        enable=True, rollback=deployment_rollback
+    ),
     network_configuration=aws.ecs.ServiceNetworkConfigurationArgs(
         subnets=public_subnet_ids,
         assign_public_ip=True,
@@ -183,5 +618,99 @@ service = aws.ecs.Service(
             container_port=80,
         )
     ],
+    # Strategy changes roll out as a new deployment rather than replacing the service
+    force_new_deployment=True,
     tags=TAGS,
+    # Moving from a launch type to a capacity provider strategy still replaces the
+    # service, and its fixed name can't be taken by the replacement while the old one
+    # exists. See the README's rollout notes.
+    opts=pulumi.ResourceOptions(delete_before_replace=True),
+)
+
+# ---------------------------------------------------------------------------------------
+# Partition maintenance
+# Runs the service's task definition on a schedule to create upcoming Reviews partitions
+# and archive old ones
+# https://www.pulumi.com/registry/packages/aws/api-docs/cloudwatch/eventtarget/
+# ---------------------------------------------------------------------------------------
+archive_schedule_role = aws.iam.Role(
+    "archive-schedule-role",
+    assume_role_policy=json.dumps(
+        {
+            "Version": "2012-10-17",
+            "Statement": [
+                {
+                    "Sid": "EventsAssumeRole",
+                    "Effect": "Allow",
+                    "Principal": {"Service": "events.amazonaws.com"},
+                    "Action": "sts:AssumeRole",
+                }
+            ],
+        }
+    ),
+    inline_policies=[
+        aws.iam.RoleInlinePolicyArgs(
+            name="run-archive-task",
+            policy=pulumi.Output.all(
+                task_definition.arn_without_revision,
+                task_shared_execution_role_arn,
+                task_role.arn,
+            ).apply(
+                lambda args: json.dumps(
+                    {
+                        "Version": "2012-10-17",
+                        "Statement": [
+                            {
+                                "Action": ["ecs:RunTask"],
+                                "Effect": "Allow",
+                                "Resource": f"{args[0]}:*",
+                            },
+                            {
+                                "Action": ["iam:PassRole"],
+                                "Effect": "Allow",
+                                "Resource": [args[1], args[2]],
+                            },
+                        ],
+                    }
+                )
+            ),
+        )
+    ],
+    tags=TAGS,
+)
+
+archive_schedule_rule = aws.cloudwatch.EventRule(
+    "archive-schedule",
+    schedule_expression=archive_schedule,
+    tags=TAGS,
+)
+
+aws.cloudwatch.EventTarget(
+    "archive-schedule-target",
+    rule=archive_schedule_rule.name,
+    arn=cluster_arn,
+    role_arn=archive_schedule_role.arn,
+    ecs_target=aws.cloudwatch.EventTargetEcsTargetArgs(
+        task_definition_arn=task_definition.arn,
+        launch_type="FARGATE",
+        network_configuration=aws.cloudwatch.EventTargetEcsTargetNetworkConfigurationArgs(
+            subnets=public_subnet_ids,
+            assign_public_ip=True,
+            security_groups=[task_shared_security_group_id],
+        ),
+    ),
+    input=json.dumps(
+        {
+            "containerOverrides": [
+                {
+                    "name": PROJECT_NAME,
+                    "command": [
+                        "sh",
+                        "-c",
+                        "piccolo reviews create_partitions && piccolo reviews archive",
+                    ],
+                }
+            ]
+        }
+    ),
 )
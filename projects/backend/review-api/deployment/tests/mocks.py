@@ -0,0 +1,79 @@
+"""Runs the deployment program under Pulumi mocks"""
+import hashlib
+import json
+import os
+import runpy
+from pathlib import Path
+from typing import Dict
+
+import pulumi
+import yaml
+from pulumi.runtime.stack import run_pulumi_func
+from pulumi.runtime.sync_await import _sync_await
+
+DEPLOYMENT = Path(__file__).resolve().parents[1]
+REPOSITORY_URL = "123456789012.dkr.ecr.us-east-1.amazonaws.com/repo"
+
+STACK_OUTPUTS = {
+    "vpc_id": "vpc-1",
+    "public_subnet_ids": ["subnet-1"],
+    "cluster_arn": "arn:aws:ecs:us-east-1:123456789012:cluster/cluster",
+    "task_shared_security_group_id": "sg-1",
+    "task_shared_execution_role_arn": "arn:aws:iam::123456789012:role/execution",
+    "https_listener_arn": "arn:aws:elasticloadbalancing:us-east-1:123456789012:listener",
+    "cloudfront_distribution_id": None,
+    "cloudfront_distribution_arn": None,
+    "orangejuicedb_credentials_secret_arn": "arn:aws:secretsmanager:us-east-1:1:secret",
+    "fargate_base": 1,
+    "fargate_weight": 100,
+    "fargate_spot_weight": 400,
+}
+
+
+class Mocks(pulumi.runtime.Mocks):
+    def __init__(self) -> None:
+        self.inputs: Dict[str, dict] = {}
+
+    def new_resource(self, args: pulumi.runtime.MockResourceArgs):
+        outputs = dict(args.inputs)
+        if args.typ == "pulumi:pulumi:StackReference":
+            outputs["outputs"] = STACK_OUTPUTS
+        elif args.typ == "aws:ecr/repository:Repository":
+            outputs.update(name="repo", repositoryUrl=REPOSITORY_URL)
+        elif args.typ == "docker-build:index:Image":
+            # Stands in for a build, a new digest whenever the image's inputs change
+            inputs = json.dumps(args.inputs, sort_keys=True, default=str)
+            outputs["digest"] = "sha256:" + hashlib.sha256(inputs.encode()).hexdigest()
+        outputs.setdefault("arn", f"arn:aws:mock:::{args.name}")
+        self.inputs[args.name] = args.inputs
+        return [f"{args.name}-id", outputs]
+
+    def call(self, args: pulumi.runtime.MockCallArgs):
+        if args.token == "aws:index/getRegion:getRegion":
+            return {"name": "us-east-1"}
+        if args.token == "aws:ecr/getAuthorizationToken:getAuthorizationToken":
+            return {"userName": "AWS", "password": "password"}
+        return {}
+
+
+def stack_config() -> Dict[str, str]:
+    with open(DEPLOYMENT / "Pulumi.development.yaml") as file:
+        config = yaml.safe_load(file)["config"]
+    return {
+        key: str(value).lower() if isinstance(value, bool) else str(value)
+        for key, value in config.items()
+    }
+
+
+def deploy(deployment: Path = DEPLOYMENT) -> Dict[str, dict]:
+    """Runs the program in a deployment directory, returns the resources' inputs"""
+    mocks = Mocks()
+    pulumi.runtime.set_mocks(mocks, project="reviews_api", stack="development")
+    pulumi.runtime.set_all_config(stack_config())
+    cwd = os.getcwd()
+    os.chdir(deployment)
+    try:
+        _sync_await(run_pulumi_func(lambda: runpy.run_path("__main__.py")))
+    finally:
+        os.chdir(cwd)
+    return mocks.inputs
@@ -0,0 +1,60 @@
+"""
+Checks the task definition only changes when the image's build inputs do, deploying
+a copy of the app's build context
+"""
+import json
+import shutil
+from pathlib import Path
+
+import pytest
+from mocks import DEPLOYMENT, REPOSITORY_URL, deploy
+
+
+@pytest.fixture
+def context(tmp_path: Path) -> Path:
+    """A copy of the app's build context, with the deployment in it"""
+    copy = tmp_path / "review-api"
+    shutil.copytree(DEPLOYMENT.parent, copy)
+    return copy
+
+
+def test_task_definition_changes_only_with_the_build_inputs(context: Path) -> None:
+    deployment = context / "deployment"
+
+    def container_definitions() -> str:
+        return deploy(deployment)["task-definition"]["containerDefinitions"]
+
+    first = container_definitions()
+    image = next(
+        container["image"]
+        for container in json.loads(first)
+        if container["image"].startswith(REPOSITORY_URL)
+    )
+    assert image.startswith(f"{REPOSITORY_URL}:src-")
+    assert "@sha256:" in image
+
+    # Nothing changed
+    assert container_definitions() == first
+
+    # Changes outside the image, excluded by .dockerignore
+    (context / "tests" / "test_new.py").write_text("def test() -> None: ...\n")
+    (deployment / "README.md").write_text("Changed\n")
+    assert container_definitions() == first
+
+    # Or left behind by running the tests and type checks
+    for cache in (".pytest_cache", ".mypy_cache"):
+        (context / cache).mkdir(exist_ok=True)
+        (context / cache / "new").write_text("Changed\n")
+    assert container_definitions() == first
+
+    # A source change is a new image
+    with open(context / "api.py", "a") as api:
+        api.write("\n# Changed\n")
+    changed = container_definitions()
+    assert changed != first
+    assert image not in changed
+
+    # And so is a dependency change
+    with open(context / "poetry.lock", "a") as lockfile:
+        lockfile.write("\n")
+    assert container_definitions() not in (first, changed)
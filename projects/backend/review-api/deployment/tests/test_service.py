@@ -0,0 +1,19 @@
+from mocks import STACK_OUTPUTS, deploy
+
+
+def test_service_uses_the_clusters_capacity_providers() -> None:
+    service = deploy()["service"]
+    assert "launchType" not in service
+    assert service["capacityProviderStrategies"] == [
+        {
+            "capacityProvider": "FARGATE",
+            "base": STACK_OUTPUTS["fargate_base"],
+            "weight": STACK_OUTPUTS["fargate_weight"],
+        },
+        {
+            "capacityProvider": "FARGATE_SPOT",
+            "weight": STACK_OUTPUTS["fargate_spot_weight"],
+        },
+    ]
+    # Strategy changes are a new deployment, not a replacement
+    assert service["forceNewDeployment"] is True
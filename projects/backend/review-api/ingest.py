@@ -0,0 +1,488 @@
+"""
+Write-behind ingestion for review submissions
+
+With WRITE_BEHIND enabled, POST /review/ validates the review, assigns its id and
+timestamps, puts it on a durable queue and answers 202 with the id straight away.
+A pool of workers drains the queue with batched inserts, retrying failed reviews
+with backoff and dead-lettering them after WRITE_BEHIND_MAX_ATTEMPTS. A review can
+be read once a worker has stored it, usually well under a second later.
+
+WRITE_BEHIND_QUEUE_URL picks the queue, there's no default:
+
+- https://sqs.<region>.amazonaws.com/... an SQS queue, failed reviews are moved to
+  WRITE_BEHIND_DEAD_LETTER_QUEUE_URL
+- sqlite:///path/to/queue.db a local SQLite file, kept across restarts
+- memory:// in process only, for development. Reviews accepted but not yet stored
+  are lost when the task stops, so never use it in a deployment
+
+Queue depth and lag (time from acceptance to storage) are written as CloudWatch
+embedded metric format log records.
+"""
+
+import asyncio
+import datetime
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Set
+
+from cache import purge, purge_paths
+from db.tables import Reviews
+from logger import log
+
+WRITE_BEHIND = os.getenv("WRITE_BEHIND", "false").lower() == "true"
+WRITE_BEHIND_QUEUE_URL = os.getenv("WRITE_BEHIND_QUEUE_URL", "")
+WRITE_BEHIND_DEAD_LETTER_QUEUE_URL = os.getenv("WRITE_BEHIND_DEAD_LETTER_QUEUE_URL", "")
+
+# Workers draining the queue, and reviews inserted per statement (SQS returns at
+# most 10 messages per receive)
+WRITE_BEHIND_WORKERS = int(os.getenv("WRITE_BEHIND_WORKERS", "2"))
+WRITE_BEHIND_BATCH_SIZE = int(os.getenv("WRITE_BEHIND_BATCH_SIZE", "10"))
+
+# Deliveries before a review is dead-lettered, retries back off exponentially
+WRITE_BEHIND_MAX_ATTEMPTS = int(os.getenv("WRITE_BEHIND_MAX_ATTEMPTS", "5"))
+RETRY_BASE_DELAY = 1.0
+RETRY_MAX_DELAY = 60.0
+
+# How long a worker waits for messages per receive, and how long a received message
+# stays hidden from other workers before it's redelivered (seconds)
+RECEIVE_WAIT = 1.0
+VISIBILITY_TIMEOUT = 30
+
+# Longest a task waits for its workers to empty an unshared queue at shutdown
+STOP_TIMEOUT = 10.0
+
+# Seconds between metric records
+METRICS_INTERVAL = 60.0
+METRICS_NAMESPACE = "reviews_api"
+
+
+@dataclass
+class QueuedReview:
+    """A review taken off the queue, handle identifies it to the queue"""
+
+    handle: Any
+    body: str
+    attempts: int
+
+
+def encode_review(row: Reviews) -> str:
+    return json.dumps(
+        {"review": row.to_dict(), "accepted_at": time.time()}, default=str
+    )
+
+
+def decode_review(body: str) -> Reviews:
+    values = json.loads(body)["review"]
+    values["id"] = uuid.UUID(values["id"])
+    for name in ("created_on", "modified_on"):
+        values[name] = datetime.datetime.fromisoformat(values[name])
+    return Reviews(**values)
+
+
+def accepted_at(body: str) -> float:
+    return json.loads(body)["accepted_at"]
+
+
+class WriteQueue(ABC):
+    """A durable queue of accepted reviews"""
+
+    # Whether other tasks drain this queue too, otherwise this task empties it
+    # before shutting down
+    shared = False
+
+    @abstractmethod
+    async def put(self, row: Reviews) -> None:
+        ...
+
+    @abstractmethod
+    async def receive(self, max_messages: int, wait: float) -> List[QueuedReview]:
+        """Up to max_messages reviews, hidden from other receivers until acked"""
+
+    @abstractmethod
+    async def ack(self, messages: List[QueuedReview]) -> None:
+        ...
+
+    @abstractmethod
+    async def retry(self, message: QueuedReview, delay: float) -> None:
+        """Redeliver the message after delay seconds"""
+
+    @abstractmethod
+    async def dead_letter(self, message: QueuedReview) -> None:
+        ...
+
+    @abstractmethod
+    async def depth(self) -> int:
+        """Reviews accepted but not yet stored or dead-lettered"""
+
+    async def close(self) -> None:
+        pass
+
+
+class SQLiteWriteQueue(WriteQueue):
+    """
+    A queue in a local SQLite database. Calls run on a thread, one at a time, the
+    transactions are short.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.connection = sqlite3.connect(
+            path, check_same_thread=False, isolation_level=None
+        )
+        self.lock = threading.Lock()
+        self.connection.executescript(
+            """
+            PRAGMA journal_mode = WAL;
+            CREATE TABLE IF NOT EXISTS messages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                body TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                visible_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS dead_letters (
+                id INTEGER PRIMARY KEY,
+                body TEXT NOT NULL,
+                attempts INTEGER NOT NULL,
+                failed_at REAL NOT NULL
+            );
+            """
+        )
+
+    async def _run(self, function: Callable, *args: Any) -> Any:
+        def locked() -> Any:
+            with self.lock:
+                return function(*args)
+
+        return await asyncio.to_thread(locked)
+
+    async def put(self, row: Reviews) -> None:
+        await self._run(
+            self.connection.execute,
+            "INSERT INTO messages (body, visible_at) VALUES (?, ?)",
+            (encode_review(row), time.time()),
+        )
+
+    def _transaction(self, function: Callable[[], Any]) -> Any:
+        self.connection.execute("BEGIN IMMEDIATE")
+        try:
+            result = function()
+        except BaseException:
+            self.connection.execute("ROLLBACK")
+            raise
+        self.connection.execute("COMMIT")
+        return result
+
+    def _receive(self, max_messages: int) -> List[QueuedReview]:
+        now = time.time()
+        rows = self.connection.execute(
+            "SELECT id, body, attempts FROM messages WHERE visible_at <= ? "
+            "ORDER BY id LIMIT ?",
+            (now, max_messages),
+        ).fetchall()
+        self.connection.executemany(
+            "UPDATE messages SET attempts = attempts + 1, visible_at = ? WHERE id = ?",
+            [(now + VISIBILITY_TIMEOUT, row[0]) for row in rows],
+        )
+        return [QueuedReview(id, body, attempts + 1) for id, body, attempts in rows]
+
+    async def receive(self, max_messages: int, wait: float) -> List[QueuedReview]:
+        deadline = time.monotonic() + wait
+        while True:
+            messages = await self._run(
+                self._transaction, lambda: self._receive(max_messages)
+            )
+            if messages or time.monotonic() >= deadline:
+                return messages
+            await asyncio.sleep(0.05)
+
+    async def ack(self, messages: List[QueuedReview]) -> None:
+        await self._run(
+            self.connection.executemany,
+            "DELETE FROM messages WHERE id = ?",
+            [(message.handle,) for message in messages],
+        )
+
+    async def retry(self, message: QueuedReview, delay: float) -> None:
+        await self._run(
+            self.connection.execute,
+            "UPDATE messages SET visible_at = ? WHERE id = ?",
+            (time.time() + delay, message.handle),
+        )
+
+    def _dead_letter(self, message: QueuedReview) -> None:
+        self.connection.execute(
+            "INSERT INTO dead_letters (id, body, attempts, failed_at) "
+            "VALUES (?, ?, ?, ?)",
+            (message.handle, message.body, message.attempts, time.time()),
+        )
+        self.connection.execute("DELETE FROM messages WHERE id = ?", (message.handle,))
+
+    async def dead_letter(self, message: QueuedReview) -> None:
+        await self._run(self._transaction, lambda: self._dead_letter(message))
+
+    def _depth(self) -> int:
+        return self.connection.execute("SELECT count(*) FROM messages").fetchone()[0]
+
+    async def depth(self) -> int:
+        return await self._run(self._depth)
+
+    async def close(self) -> None:
+        await self._run(self.connection.close)
+
+
+class SQSWriteQueue(WriteQueue):
+    """
+    An SQS queue. boto3 blocks, so calls run on a dedicated thread pool, where
+    workers long polling can't hold up anything else run with asyncio.to_thread.
+    """
+
+    shared = True
+
+    def __init__(
+        self, queue_url: str, dead_letter_queue_url: str, max_threads: int
+    ) -> None:
+        import boto3
+
+        self.queue_url = queue_url
+        self.dead_letter_queue_url = dead_letter_queue_url
+        self.client = boto3.client("sqs")
+        self.executor = ThreadPoolExecutor(max_threads, thread_name_prefix="sqs")
+
+    async def _run(self, function: Callable, **kwargs: Any) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(
+            self.executor, lambda: function(**kwargs)
+        )
+
+    async def put(self, row: Reviews) -> None:
+        await self._run(
+            self.client.send_message,
+            QueueUrl=self.queue_url,
+            MessageBody=encode_review(row),
+        )
+
+    async def receive(self, max_messages: int, wait: float) -> List[QueuedReview]:
+        response = await self._run(
+            self.client.receive_message,
+            QueueUrl=self.queue_url,
+            MaxNumberOfMessages=min(max_messages, 10),
+            WaitTimeSeconds=round(wait),
+            VisibilityTimeout=VISIBILITY_TIMEOUT,
+            AttributeNames=["ApproximateReceiveCount"],
+        )
+        return [
+            QueuedReview(
+                message["ReceiptHandle"],
+                message["Body"],
+                int(message["Attributes"]["ApproximateReceiveCount"]),
+            )
+            for message in response.get("Messages", [])
+        ]
+
+    async def ack(self, messages: List[QueuedReview]) -> None:
+        if not messages:
+            return
+        await self._run(
+            self.client.delete_message_batch,
+            QueueUrl=self.queue_url,
+            Entries=[
+                {"Id": str(index), "ReceiptHandle": message.handle}
+                for index, message in enumerate(messages)
+            ],
+        )
+
+    async def retry(self, message: QueuedReview, delay: float) -> None:
+        await self._run(
+            self.client.change_message_visibility,
+            QueueUrl=self.queue_url,
+            ReceiptHandle=message.handle,
+            VisibilityTimeout=round(delay),
+        )
+
+    async def dead_letter(self, message: QueuedReview) -> None:
+        await self._run(
+            self.client.send_message,
+            QueueUrl=self.dead_letter_queue_url,
+            MessageBody=message.body,
+        )
+        await self.ack([message])
+
+    async def depth(self) -> int:
+        response = await self._run(
+            self.client.get_queue_attributes,
+            QueueUrl=self.queue_url,
+            AttributeNames=[
+                "ApproximateNumberOfMessages",
+                "ApproximateNumberOfMessagesNotVisible",
+                "ApproximateNumberOfMessagesDelayed",
+            ],
+        )
+        return sum(int(value) for value in response["Attributes"].values())
+
+    async def close(self) -> None:
+        self.executor.shutdown(wait=False)
+
+
+def open_queue(
+    url: str = WRITE_BEHIND_QUEUE_URL,
+    dead_letter_queue_url: str = WRITE_BEHIND_DEAD_LETTER_QUEUE_URL,
+) -> WriteQueue:
+    if url.startswith("https://"):
+        # One thread per long polling worker, plus a few for submissions
+        return SQSWriteQueue(url, dead_letter_queue_url, WRITE_BEHIND_WORKERS + 4)
+    if url.startswith("sqlite://"):
+        return SQLiteWriteQueue(url[len("sqlite://") :])
+    if url == "memory://":
+        log.warning("Write-behind queue is in memory, accepted reviews can be lost")
+        return SQLiteWriteQueue(":memory:")
+    if not url:
+        # Rather than accept reviews that a task stop would lose
+        raise ValueError("WRITE_BEHIND needs a WRITE_BEHIND_QUEUE_URL")
+    raise ValueError(f"Unsupported write-behind queue {url}")
+
+
+class IngestWorkers:
+    """Drains a WriteQueue into the Reviews table"""
+
+    def __init__(
+        self,
+        queue: WriteQueue,
+        base_path: str,
+        workers: int = WRITE_BEHIND_WORKERS,
+        batch_size: int = WRITE_BEHIND_BATCH_SIZE,
+        max_attempts: int = WRITE_BEHIND_MAX_ATTEMPTS,
+        metrics_interval: float = METRICS_INTERVAL,
+    ) -> None:
+        self.queue = queue
+        self.base_path = base_path.rstrip("/")
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.metrics_interval = metrics_interval
+        self.tasks: Set[asyncio.Task] = set()
+        # Since the last metrics record
+        self.lag = 0.0
+        self.stored = 0
+        self.dead_lettered = 0
+
+    def start(self) -> None:
+        for _ in range(self.workers):
+            self.tasks.add(asyncio.create_task(self._work()))
+        self.tasks.add(asyncio.create_task(self._report()))
+
+    async def stop(self, timeout: float = STOP_TIMEOUT) -> None:
+        """
+        Stops the workers, once they've emptied the queue if no other task will. A
+        batch inserted but not yet acked is redelivered, which is harmless, the
+        insert skips reviews already stored.
+        """
+        deadline = time.monotonic() + timeout
+        while (
+            not self.queue.shared
+            and time.monotonic() < deadline
+            and await self.queue.depth()
+        ):
+            await asyncio.sleep(0.1)
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks.clear()
+        await self.queue.close()
+
+    async def _insert(self, messages: List[QueuedReview]) -> None:
+        await Reviews.insert(
+            *(decode_review(message.body) for message in messages)
+        ).on_conflict(action="DO NOTHING")
+
+    async def _stored(self, messages: List[QueuedReview]) -> None:
+        await self.queue.ack(messages)
+        now = time.time()
+        self.lag = max(
+            [self.lag] + [now - accepted_at(message.body) for message in messages]
+        )
+        self.stored += len(messages)
+
+    async def _failed(self, message: QueuedReview) -> None:
+        if message.attempts >= self.max_attempts:
+            log.error(
+                "Dead-lettering review",
+                extra={"attempts": message.attempts, "body": message.body},
+            )
+            await self.queue.dead_letter(message)
+            self.dead_lettered += 1
+            return
+        delay = min(RETRY_BASE_DELAY * 2 ** (message.attempts - 1), RETRY_MAX_DELAY)
+        await self.queue.retry(message, delay)
+
+    async def _drain(self, messages: List[QueuedReview]) -> None:
+        try:
+            await self._insert(messages)
+        except Exception:
+            log.exception("Batch insert failed", extra={"batch": len(messages)})
+        else:
+            await self._stored(messages)
+            purge(purge_paths(self.base_path, ""))
+            return
+
+        # One at a time, so a single bad review doesn't hold back the rest
+        stored = []
+        for message in messages:
+            try:
+                await self._insert([message])
+                stored.append(message)
+            except Exception:
+                await self._failed(message)
+        if stored:
+            await self._stored(stored)
+            purge(purge_paths(self.base_path, ""))
+
+    async def _work(self) -> None:
+        while True:
+            try:
+                messages = await self.queue.receive(self.batch_size, RECEIVE_WAIT)
+                if messages:
+                    await self._drain(messages)
+            except Exception:
+                log.exception("Write-behind worker failed")
+                await asyncio.sleep(RETRY_BASE_DELAY)
+
+    async def metrics(self) -> Dict[str, Any]:
+        """Queue metrics since the last call, in embedded metric format"""
+        metrics = {
+            "WriteBehindQueueDepth": (await self.queue.depth(), "Count"),
+            "WriteBehindLag": (round(self.lag, 3), "Seconds"),
+            "WriteBehindStored": (self.stored, "Count"),
+            "WriteBehindDeadLettered": (self.dead_lettered, "Count"),
+        }
+        self.lag = 0.0
+        self.stored = 0
+        self.dead_lettered = 0
+        return {
+            "_aws": {
+                "Timestamp": int(time.time() * 1000),
+                "CloudWatchMetrics": [
+                    {
+                        "Namespace": METRICS_NAMESPACE,
+                        "Dimensions": [[]],
+                        "Metrics": [
+                            {"Name": name, "Unit": unit}
+                            for name, (_, unit) in metrics.items()
+                        ],
+                    }
+                ],
+            },
+            **{name: value for name, (value, _) in metrics.items()},
+        }
+
+    async def _report(self) -> None:
+        while True:
+            await asyncio.sleep(self.metrics_interval)
+            try:
+                log.info("Write-behind queue", extra=await self.metrics())
+            except Exception:
+                log.exception("Unable to read write-behind queue metrics")
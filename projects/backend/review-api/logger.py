@@ -0,0 +1,208 @@
+"""
+Structured JSON logging for the review service
+
+Records are put on a bounded in-memory queue and written to stdout by a background
+thread, so a slow log driver (awslogs applying backpressure) never blocks the event
+loop. If stdout falls too far behind, records are dropped and counted instead.
+"""
+
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import time
+import uuid
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+from typing import List, Optional, TextIO
+
+from db.engine import db_time
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+
+# Fraction of successful requests that get an access log, errors are always logged
+ACCESS_LOG_SAMPLE_RATE = float(os.getenv("ACCESS_LOG_SAMPLE_RATE", "1.0"))
+
+# Records waiting to be written, once full new records are dropped rather than memory
+# growing without bound
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+REQUEST_ID_HEADER = b"x-request-id"
+
+# Attributes every LogRecord has, anything else was passed in via `extra`
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {
+    "message",
+    "asctime",
+    "taskName",
+}
+
+request_id: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+log = logging.getLogger("reviews")
+access_log = logging.getLogger("reviews.access")
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line, with any `extra` fields at the top level"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "timestamp": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        current_id = getattr(record, "request_id", None)
+        if current_id:
+            payload["request_id"] = current_id
+        for key, value in vars(record).items():
+            if key not in _RESERVED and key != "request_id":
+                payload[key] = value
+        if record.exc_info:
+            payload["exception"] = self.formatException(record.exc_info)
+        return json.dumps(payload, default=str)
+
+    def formatTime(self, record: logging.LogRecord, datefmt=None) -> str:
+        created = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created))
+        return f"{created}.{int(record.msecs):03d}Z"
+
+
+class RequestQueueHandler(QueueHandler):
+    """
+    Captures the request id while still on the request's task. Unlike QueueHandler,
+    the record isn't formatted here, that happens on the listener thread.
+
+    Records that don't fit on the queue are dropped, and a warning with how many were
+    lost is queued ahead of the next record that fits.
+    """
+
+    def __init__(self, log_queue: queue.Queue) -> None:
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            if self.dropped:
+                self.queue.put_nowait(self._dropped_record())
+                self.dropped = 0
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _dropped_record(self) -> logging.LogRecord:
+        record = log.makeRecord(
+            log.name,
+            logging.WARNING,
+            __file__,
+            0,
+            "Dropped log records",
+            (),
+            None,
+            extra={"dropped": self.dropped},
+        )
+        record.request_id = None
+        return record
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.request_id = request_id.get()
+        return record
+
+
+class RequestQueueListener(QueueListener):
+    """A QueueListener that waits for room on a full queue to stop, rather than failing"""
+
+    def __init__(self, log_queue: queue.Queue, *handlers: logging.Handler) -> None:
+        super().__init__(log_queue, *handlers, respect_handler_level=False)
+        self.log_queue = log_queue
+
+    def enqueue_sentinel(self) -> None:
+        # None is QueueListener's sentinel
+        self.log_queue.put(None)
+
+    def stop(self) -> None:
+        # Once per process in production, but the app's lifespan can run more than once
+        # in tests
+        if self._thread:
+            super().stop()
+
+
+def configure_logging(
+    stream: TextIO = sys.stdout, size: int = LOG_QUEUE_SIZE
+) -> QueueListener:
+    """Route the root, uvicorn and piccolo loggers through the queue"""
+    log_queue: queue.Queue = queue.Queue(maxsize=size)
+
+    stream_handler = logging.StreamHandler(stream)
+    stream_handler.setFormatter(JSONFormatter())
+    listener = RequestQueueListener(log_queue, stream_handler)
+
+    root = logging.getLogger()
+    root.handlers = [RequestQueueHandler(log_queue)]
+    root.setLevel(LOG_LEVEL)
+
+    # Uvicorn installs its own stream handlers, send everything through ours instead.
+    # Its access log is replaced by AccessLogMiddleware.
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        logger = logging.getLogger(name)
+        logger.handlers = []
+        logger.propagate = True
+    logging.getLogger("uvicorn.access").disabled = True
+
+    listener.start()
+    return listener
+
+
+class AccessLogMiddleware:
+    """
+    Tags each request with an id and writes one access log record per (sampled)
+    request with the route, status, latency and time spent in the database.
+    """
+
+    def __init__(self, app: ASGIApp, sample_rate: float = ACCESS_LOG_SAMPLE_RATE):
+        self.app = app
+        self.sample_rate = sample_rate
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        incoming = dict(scope["headers"]).get(REQUEST_ID_HEADER)
+        current_id = incoming.decode("latin-1") if incoming else uuid.uuid4().hex
+        request_id_token = request_id.set(current_id)
+        request_db_time: List[float] = [0.0]
+        db_time_token = db_time.set(request_db_time)
+        status = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message.setdefault("headers", []).append(
+                    (REQUEST_ID_HEADER, current_id.encode("latin-1"))
+                )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if status >= 500 or random.random() < self.sample_rate:
+                route = scope.get("route")
+                access_log.info(
+                    "request",
+                    extra={
+                        "method": scope["method"],
+                        "path": scope["path"],
+                        "route": getattr(route, "path", None),
+                        "status": status,
+                        "latency_ms": round((time.perf_counter() - started) * 1000, 3),
+                        "db_ms": round(request_db_time[0] * 1000, 3),
+                        "sample_rate": self.sample_rate,
+                    },
+                )
+            db_time.reset(db_time_token)
+            request_id.reset(request_id_token)
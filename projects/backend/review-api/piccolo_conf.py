@@ -1,13 +1,13 @@
 import json
 import os
 
+from db.engine import ReviewsEngine
 from piccolo.conf.apps import AppRegistry
-from piccolo.engine.postgres import PostgresEngine
 
 # These credentials are injected into our container via the ECS task definition
 DB_CREDS = json.loads(os.environ["DATABASE_CREDENTIALS"])
 
-DB = PostgresEngine(
+DB = ReviewsEngine(
     config={
         "database": DB_CREDS["DATABASE_NAME"],
         "user": DB_CREDS["USERNAME"],
@@ -0,0 +1,66 @@
+"""
+Entrypoint for the review service, uvicorn with a graceful drain on SIGTERM
+
+ECS sends SIGTERM when a task is stopped, including when Fargate Spot reclaims it, and
+SIGKILL once the container's stopTimeout (120s, the Spot notice) runs out. Plain
+uvicorn stops listening as soon as it gets SIGTERM, while the load balancer may still
+route a few requests to the task before its deregistration takes effect. Instead:
+
+1. /review/health starts answering 503, and new requests are still served for
+   SHUTDOWN_DRAIN seconds
+2. uvicorn stops listening and waits up to SHUTDOWN_TIMEOUT seconds for in-flight
+   requests to finish
+3. The lifespan shutdown stops the ingest workers and closes the connection pool
+"""
+
+import asyncio
+import os
+import signal
+from types import FrameType
+from typing import Optional
+
+import uvicorn
+from api import api
+from logger import log
+
+# The container port the load balancer targets
+PORT = int(os.getenv("PORT", "80"))
+
+# Seconds new requests are still served for after SIGTERM, while the load balancer
+# stops routing to the task
+SHUTDOWN_DRAIN = float(os.getenv("SHUTDOWN_DRAIN", "5"))
+
+# Seconds in-flight requests get to finish once we stop listening
+SHUTDOWN_TIMEOUT = int(os.getenv("SHUTDOWN_TIMEOUT", "60"))
+
+
+class DrainingServer(uvicorn.Server):
+    """A uvicorn Server that reports unready and keeps serving for a while on SIGTERM"""
+
+    draining = False
+
+    def handle_exit(self, sig: int, frame: Optional[FrameType]) -> None:
+        if sig != signal.SIGTERM or self.draining:
+            super().handle_exit(sig, frame)
+            return
+
+        self.draining = True
+        api.state.ready = False
+        log.info("Draining before shutdown", extra={"drain": SHUTDOWN_DRAIN})
+        asyncio.get_running_loop().call_later(
+            SHUTDOWN_DRAIN, super().handle_exit, sig, frame
+        )
+
+
+if __name__ == "__main__":
+    DrainingServer(
+        uvicorn.Config(
+            api,
+            host="0.0.0.0",
+            port=PORT,
+            access_log=False,
+            # Keep the JSON logging set up by logger.py
+            log_config=None,
+            timeout_graceful_shutdown=SHUTDOWN_TIMEOUT,
+        )
+    ).run()
@@ -0,0 +1,40 @@
+import os
+from typing import Iterator, List
+
+import pytest
+from fastapi.testclient import TestClient
+
+
+@pytest.fixture(scope="session")
+def database() -> None:
+    """
+    For tests that run against Postgres, skipped unless DATABASE_CREDENTIALS is set
+    (see piccolo_conf.py). The database needs `piccolo migrations forwards reviews`.
+    """
+    if "DATABASE_CREDENTIALS" not in os.environ:
+        pytest.skip("DATABASE_CREDENTIALS isn't set")
+
+
+@pytest.fixture
+def client(database) -> Iterator[TestClient]:
+    """The API, started up with its connection pool"""
+    from api import api
+
+    with TestClient(api) as client:
+        yield client
+
+
+@pytest.fixture
+def queries(monkeypatch) -> Iterator[List[str]]:
+    """The statements the database runs through the pool, from here on"""
+    from db.engine import ReviewsEngine
+
+    statements: List[str] = []
+    run_in_pool = ReviewsEngine._run_in_pool
+
+    async def recording(self, query, args=None):
+        statements.append(query)
+        return await run_in_pool(self, query, args)
+
+    monkeypatch.setattr(ReviewsEngine, "_run_in_pool", recording)
+    yield statements
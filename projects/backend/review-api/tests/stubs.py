@@ -0,0 +1,44 @@
+"""
+Helpers for driving ASGI apps and middleware in the tests, without a server
+"""
+
+from typing import Iterable, List, Tuple
+
+
+async def ok_app(scope, receive, send) -> None:
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"{}"})
+
+
+async def call(
+    app,
+    path: str = "/review/",
+    headers: Iterable[Tuple[bytes, bytes]] = (),
+    method: str = "GET",
+    query_string: bytes = b"",
+) -> List[dict]:
+    """Runs one request through an ASGI app, returns the messages it sent"""
+    sent = []
+
+    async def receive() -> dict:
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message: dict) -> None:
+        sent.append(message)
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": query_string,
+        "headers": list(headers),
+        "client": ("127.0.0.1", 50000),
+        "server": ("testserver", 80),
+    }
+    await app(scope, receive, send)
+    return sent
@@ -0,0 +1,66 @@
+import asyncio
+import uuid
+
+from admission import (
+    AdmissionControlMiddleware,
+    TokenBucketLimitProvider,
+    client_identifier,
+)
+from stubs import call, ok_app
+
+
+def scope(*forwarded: str, client: str = "10.0.0.1") -> dict:
+    headers = [(b"x-forwarded-for", value.encode()) for value in forwarded]
+    return {"headers": headers, "client": (client, 50000)}
+
+
+def test_client_is_the_entry_the_load_balancer_appended() -> None:
+    assert client_identifier(scope("198.51.100.7")) == "198.51.100.7"
+    # Anything the client sent itself is to the left
+    assert client_identifier(scope("1.2.3.4, 198.51.100.7")) == "198.51.100.7"
+    assert client_identifier(scope("1.2.3.4", "198.51.100.7")) == "198.51.100.7"
+    assert client_identifier(scope()) == "10.0.0.1"
+
+
+def test_client_behind_cloudfront() -> None:
+    # client sent, CloudFront appended the viewer, the load balancer the edge
+    forwarded = "1.2.3.4, 198.51.100.7, 130.176.0.1"
+    assert client_identifier(scope(forwarded), proxy_hops=1) == "198.51.100.7"
+    assert client_identifier(scope("198.51.100.7"), proxy_hops=1) == "198.51.100.7"
+
+
+def test_rate_limit_cant_be_dodged_with_forwarded_for() -> None:
+    middleware = AdmissionControlMiddleware(
+        ok_app, "/review", rate_limiter=TokenBucketLimitProvider(rate=0.001, burst=5)
+    )
+
+    async def run() -> list:
+        statuses = []
+        for _ in range(10):
+            spoofed = f"{uuid.uuid4()}, 198.51.100.7".encode()
+            sent = await call(middleware, headers=[(b"x-forwarded-for", spoofed)])
+            statuses.append(sent[0]["status"])
+        return statuses
+
+    assert asyncio.run(run()) == [200] * 5 + [429] * 5
+
+
+def test_sheds_with_retry_after_once_the_queue_is_full() -> None:
+    async def slow_app(scope, receive, send) -> None:
+        await asyncio.sleep(0.05)
+        await ok_app(scope, receive, send)
+
+    middleware = AdmissionControlMiddleware(
+        slow_app, "/review", max_in_flight=1, max_queue=1, retry_after=3
+    )
+
+    async def run() -> list:
+        return await asyncio.gather(
+            *(call(middleware) for _ in range(3)),
+            call(middleware, path="/review/health"),
+        )
+
+    *requests, health = asyncio.run(run())
+    assert [sent[0]["status"] for sent in requests] == [200, 200, 503]
+    assert (b"retry-after", b"3") in requests[2][0]["headers"]
+    assert health[0]["status"] == 200
@@ -0,0 +1,60 @@
+import asyncio
+import datetime
+
+import pytest
+from db.archive import archivable, archive_partition
+from db.partitions import attached_partitions, create_partition
+
+UTC = datetime.timezone.utc
+MONTH = datetime.datetime(2001, 1, 1, tzinfo=UTC)
+PARTITION = "reviews_p2001_01"
+
+
+def test_archivable() -> None:
+    partitions = ["reviews_default", "reviews_p2025_09", "reviews_p2025_10"]
+    now = datetime.datetime(2026, 10, 19, tzinfo=UTC)
+    assert archivable(partitions, 12, now) == ["reviews_p2025_09"]
+
+
+@pytest.fixture
+def old_reviews(database):
+    from db.tables import Reviews
+
+    async def create() -> None:
+        await create_partition(MONTH)
+        await Reviews.insert(
+            *(
+                Reviews(title="t", rating=5, body="b", created_on=MONTH)
+                for _ in range(3)
+            )
+        )
+
+    async def remove() -> None:
+        await Reviews.raw(f'DROP TABLE IF EXISTS "{PARTITION}"')
+
+    asyncio.run(create())
+    yield Reviews
+    asyncio.run(remove())
+
+
+def test_archive_then_drop(old_reviews, tmp_path) -> None:
+    import pyarrow.parquet as pq
+
+    location = asyncio.run(archive_partition(PARTITION, str(tmp_path), drop=True))
+
+    assert pq.read_metadata(location).num_rows == 3
+    assert PARTITION not in asyncio.run(attached_partitions())
+    assert not old_reviews.exists().where(old_reviews.created_on == MONTH).run_sync()
+
+
+def test_failed_archive_attaches_the_partition_again(old_reviews, tmp_path) -> None:
+    # A file where the destination directory should be
+    destination = tmp_path / "taken"
+    destination.write_text("")
+
+    with pytest.raises(FileExistsError):
+        asyncio.run(archive_partition(PARTITION, str(destination), drop=True))
+
+    assert PARTITION in asyncio.run(attached_partitions())
+    count = old_reviews.count().where(old_reviews.created_on == MONTH).run_sync()
+    assert count == 3
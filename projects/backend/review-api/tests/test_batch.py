@@ -0,0 +1,67 @@
+import time
+import uuid
+from typing import Iterator, List
+
+import pytest
+
+REVIEWS = 50
+
+
+@pytest.fixture
+def reviews(client) -> Iterator[List[dict]]:
+    created = [
+        client.post(
+            "/review/", json={"title": f"t{number}", "rating": 5, "body": "b"}
+        ).json()[0]
+        for number in range(REVIEWS)
+    ]
+    yield [client.get(f"/review/{review['id']}/").json() for review in created]
+    for review in created:
+        client.delete(f"/review/{review['id']}/")
+
+
+def test_rows_follow_the_requested_order(client, reviews) -> None:
+    missing = str(uuid.uuid4())
+    ids = [reviews[2]["id"], missing, reviews[0]["id"], reviews[2]["id"]]
+
+    for response in (
+        client.get("/review/batch", params={"ids": ",".join(ids)}),
+        client.post("/review/batch", json={"ids": ids}),
+    ):
+        assert response.status_code == 200
+        assert response.json() == {
+            # Serialized like GET /review/{id}/, timestamps included
+            "rows": [reviews[2], None, reviews[0], reviews[2]],
+            "not_found": [missing],
+        }
+
+
+def test_bad_requests(client) -> None:
+    assert client.get("/review/batch", params={"ids": "nope"}).status_code == 400
+    too_many = ",".join(str(uuid.uuid4()) for _ in range(101))
+    assert client.get("/review/batch", params={"ids": too_many}).status_code == 400
+
+
+def test_one_query_for_the_batch(client, reviews, queries) -> None:
+    """
+    A batch against single fetches of the same reviews. Run with -s for the numbers.
+    """
+    ids = [review["id"] for review in reviews]
+
+    queries.clear()
+    started = time.perf_counter()
+    for row_id in ids:
+        assert client.get(f"/review/{row_id}/").status_code == 200
+    singles = time.perf_counter() - started, len(queries)
+
+    queries.clear()
+    started = time.perf_counter()
+    assert client.post("/review/batch", json={"ids": ids}).status_code == 200
+    batch = time.perf_counter() - started, len(queries)
+
+    print(
+        f"{REVIEWS} reviews: {singles[0] * 1000:.1f}ms and {singles[1]} queries "
+        f"fetched one by one, {batch[0] * 1000:.1f}ms and {batch[1]} query batched"
+    )
+    assert batch[1] == 1
+    assert batch[0] < singles[0]
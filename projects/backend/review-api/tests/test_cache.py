@@ -0,0 +1,82 @@
+import ast
+import asyncio
+from pathlib import Path
+from typing import List
+
+import cache
+from cache import CACHE_KEY_QUERY_STRINGS, CacheControlMiddleware
+from starlette.datastructures import Headers
+from stubs import call, ok_app
+
+LOAD_BALANCER = Path(__file__).resolve().parents[3] / "load_balancer" / "__main__.py"
+
+
+def cache_control(query_string: bytes) -> str:
+    start, _ = asyncio.run(
+        call(CacheControlMiddleware(ok_app, "/review"), query_string=query_string)
+    )
+    return Headers(raw=start["headers"])["cache-control"]
+
+
+def test_only_reads_keyed_on_all_their_params_are_cached() -> None:
+    assert cache_control(b"").startswith("public")
+    assert cache_control(b"rating=5&rating__operator=gte&__order=-id").startswith(
+        "public"
+    )
+    # Read by piccolo_api but not in the cache key, so never cached under it
+    for query_string in (b"title__operator=is_null", b"rating[]=5", b"rating=5&x="):
+        assert cache_control(query_string) == "no-store"
+
+
+def test_cache_key_matches_the_distribution() -> None:
+    """The params a cached response was read with are the ones CloudFront keys on"""
+    module = ast.parse(LOAD_BALANCER.read_text())
+    whitelist = next(
+        ast.literal_eval(node.value)
+        for node in module.body
+        if isinstance(node, ast.Assign)
+        and [getattr(target, "id", None) for target in node.targets]
+        == ["REVIEW_CACHE_QUERY_STRINGS"]
+    )
+    assert set(whitelist) == CACHE_KEY_QUERY_STRINGS
+
+
+class RecordingCloudFront:
+    def __init__(self) -> None:
+        self.invalidations: List[List[str]] = []
+
+    def create_invalidation(self, DistributionId: str, InvalidationBatch: dict) -> None:
+        self.invalidations.append(InvalidationBatch["Paths"]["Items"])
+
+
+def test_purges_are_batched(monkeypatch) -> None:
+    cloudfront = RecordingCloudFront()
+    monkeypatch.setattr(cache, "CLOUDFRONT_DISTRIBUTION_ID", "E123")
+    monkeypatch.setattr(cache, "PURGE_INTERVAL", 0.1)
+    monkeypatch.setattr(cache, "_cloudfront", cloudfront)
+
+    async def run() -> None:
+        # Writes within one interval, sent as one invalidation of their paths
+        cache.purge(cache.purge_paths("/review", "a"))
+        cache.purge(cache.purge_paths("/review", "a"))
+        cache.purge(cache.purge_paths("/review", ""))
+        assert cloudfront.invalidations == []
+        await asyncio.sleep(0.3)
+        assert cloudfront.invalidations == [sorted(cache.purge_paths("/review", "a"))]
+
+        # Too many wildcards for one invalidation, all collapsed into one
+        for resource in ("a", "b", "c"):
+            cache.purge(cache.purge_paths("/review", resource))
+        await asyncio.sleep(0.3)
+        assert cloudfront.invalidations[1:] == [["/review/*"]]
+
+        # Shutting down doesn't wait out the interval
+        cache.purge(cache.purge_paths("/review", ""))
+        await cache.flush_purges()
+        assert cloudfront.invalidations[2:] == [
+            sorted(cache.purge_paths("/review", ""))
+        ]
+        await asyncio.sleep(0.3)
+        assert len(cloudfront.invalidations) == 3
+
+    asyncio.run(run())
@@ -0,0 +1,119 @@
+import asyncio
+import json
+from typing import Tuple
+
+from coalesce import CoalescingMiddleware, normalize_query
+from stubs import call
+
+
+class CountingApp:
+    """Stands in for the CRUD app, each call is one database query"""
+
+    def __init__(self, delay: float = 0.05) -> None:
+        self.delay = delay
+        self.calls = 0
+
+    async def __call__(self, scope, receive, send) -> None:
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        body = json.dumps({"path": scope["path"], "call": self.calls}).encode()
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": body})
+
+
+async def concurrently(app, requests: int, **kwargs) -> list:
+    return await asyncio.gather(*(call(app, **kwargs) for _ in range(requests)))
+
+
+def test_concurrent_identical_reads_run_one_query() -> None:
+    app = CountingApp()
+    responses = asyncio.run(
+        concurrently(CoalescingMiddleware(app, "/review"), 100, path="/review/1/")
+    )
+
+    assert app.calls == 1
+    for sent in responses:
+        assert sent[0]["status"] == 200
+        assert json.loads(sent[-1]["body"]) == {"path": "/review/1/", "call": 1}
+
+
+def test_query_parameter_order_doesnt_matter() -> None:
+    assert normalize_query(b"b=2&a=1") == normalize_query(b"a=1&b=2")
+
+    app = CountingApp()
+    middleware = CoalescingMiddleware(app, "/review")
+
+    async def run() -> None:
+        await asyncio.gather(
+            call(middleware, query_string=b"__page=1&rating=5"),
+            call(middleware, query_string=b"rating=5&__page=1"),
+            call(middleware, query_string=b"rating=4&__page=1"),
+        )
+
+    asyncio.run(run())
+    assert app.calls == 2
+
+
+def test_writes_and_health_checks_arent_coalesced() -> None:
+    app = CountingApp()
+    middleware = CoalescingMiddleware(app, "/review")
+    asyncio.run(concurrently(middleware, 5, method="POST"))
+    asyncio.run(concurrently(middleware, 5, path="/review/health"))
+    assert app.calls == 10
+
+
+def test_followers_stop_waiting_after_max_wait() -> None:
+    app = CountingApp(delay=0.2)
+    middleware = CoalescingMiddleware(app, "/review", max_wait=0.05)
+    responses = asyncio.run(concurrently(middleware, 3))
+    assert app.calls == 3
+    assert all(sent[0]["status"] == 200 for sent in responses)
+
+
+def test_followers_run_their_own_request_when_the_leader_fails() -> None:
+    calls = 0
+
+    async def failing_once(scope, receive, send) -> None:
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        if calls == 1:
+            raise RuntimeError("connection lost")
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"{}"})
+
+    middleware = CoalescingMiddleware(failing_once, "/review")
+
+    async def run() -> list:
+        return await asyncio.gather(
+            *(call(middleware) for _ in range(3)), return_exceptions=True
+        )
+
+    results = asyncio.run(run())
+    assert isinstance(results[0], RuntimeError)
+    assert all(sent[0]["status"] == 200 for sent in results[1:])
+    assert calls == 3
+
+
+def test_concurrent_reads_of_a_review_share_its_queries(database, queries) -> None:
+    from api import api
+    from db.tables import Reviews
+
+    async def run() -> Tuple[list, int]:
+        engine = Reviews._meta.db
+        await engine.start_connection_pool()
+        try:
+            review = Reviews(title="t", rating=5, body="b")
+            await review.save()
+            queries.clear()
+            responses = await concurrently(api, 50, path=f"/review/{review.id}/")
+            reads = len(queries)
+            await review.remove()
+            return responses, reads
+        finally:
+            await engine.close_connection_pool()
+
+    responses, reads = asyncio.run(run())
+    assert all(sent[0]["status"] == 200 for sent in responses)
+    # The CRUD detail route checks the review exists, then selects it
+    assert reads == 2
@@ -0,0 +1,90 @@
+import asyncio
+import datetime
+
+import pytest
+from ingest import IngestWorkers, SQLiteWriteQueue, WriteQueue, open_queue
+
+UTC = datetime.timezone.utc
+
+
+def review(title: str = "t", rating: int = 5):
+    from db.tables import Reviews
+
+    now = datetime.datetime.now(UTC)
+    return Reviews(
+        title=title, rating=rating, body="b", created_on=now, modified_on=now
+    )
+
+
+def test_write_behind_needs_an_explicit_queue() -> None:
+    with pytest.raises(ValueError, match="WRITE_BEHIND_QUEUE_URL"):
+        open_queue("")
+    with pytest.raises(ValueError, match="Unsupported"):
+        open_queue("redis://localhost")
+    with pytest.raises(TypeError):
+        WriteQueue()  # type: ignore[abstract]
+
+
+def test_sqlite_queue_retries_and_dead_letters(tmp_path) -> None:
+    async def run() -> None:
+        path = tmp_path / "queue.db"
+        queue = SQLiteWriteQueue(str(path))
+        rows = [review("first"), review("second")]
+        for row in rows:
+            await queue.put(row)
+        assert await queue.depth() == 2
+
+        first, second = await queue.receive(10, 0)
+        assert (first.attempts, second.attempts) == (1, 1)
+        # Hidden from other receivers until acked or retried
+        assert await queue.receive(10, 0) == []
+
+        await queue.ack([first])
+        await queue.retry(second, 0)
+        (again,) = await queue.receive(10, 0)
+        assert again.body == second.body
+        assert again.attempts == 2
+
+        await queue.dead_letter(again)
+        assert await queue.depth() == 0
+        await queue.close()
+
+        # Kept across restarts
+        queue = SQLiteWriteQueue(str(path))
+        assert queue.connection.execute(
+            "SELECT attempts FROM dead_letters"
+        ).fetchall() == [(2,)]
+        await queue.close()
+
+    asyncio.run(run())
+
+
+def test_workers_store_reviews_and_dead_letter_bad_ones(database, tmp_path) -> None:
+    from db.tables import Reviews
+
+    async def run() -> None:
+        queue = SQLiteWriteQueue(str(tmp_path / "queue.db"))
+        good = [review("good"), review("good")]
+        # Violates the rating's smallint range, every insert of it fails
+        bad = review("bad", rating=100000)
+        for row in [*good, bad]:
+            await queue.put(row)
+
+        workers = IngestWorkers(queue, "/review", workers=2, max_attempts=2)
+        workers.start()
+        try:
+            for _ in range(100):
+                if not await queue.depth():
+                    break
+                await asyncio.sleep(0.1)
+            stored = await Reviews.select(Reviews.id).where(
+                Reviews.id.is_in([row.id for row in good + [bad]])
+            )
+            assert {row["id"] for row in stored} == {row.id for row in good}
+            assert workers.stored == 2
+            assert workers.dead_lettered == 1
+        finally:
+            await workers.stop(timeout=0)
+            await Reviews.delete().where(Reviews.id.is_in([row.id for row in good]))
+
+    asyncio.run(run())
@@ -0,0 +1,128 @@
+import asyncio
+import io
+import json
+import logging
+import queue
+import time
+
+import pytest
+from logger import (
+    AccessLogMiddleware,
+    JSONFormatter,
+    RequestQueueHandler,
+    configure_logging,
+)
+from stubs import call, ok_app
+
+
+class SlowStream(io.StringIO):
+    """stdout with a log driver applying backpressure, every write blocks"""
+
+    def __init__(self, delay: float) -> None:
+        super().__init__()
+        self.delay = delay
+
+    def write(self, text: str) -> int:
+        time.sleep(self.delay)
+        return super().write(text)
+
+
+@pytest.fixture
+def restore_root_logger():
+    root = logging.getLogger()
+    handlers, level = root.handlers, root.level
+    yield
+    root.handlers = handlers
+    root.setLevel(level)
+
+
+def test_access_log_is_json_with_request_id(restore_root_logger) -> None:
+    stream = io.StringIO()
+    listener = configure_logging(stream)
+    sent = asyncio.run(
+        call(AccessLogMiddleware(ok_app), headers=[(b"x-request-id", b"abc")])
+    )
+    listener.stop()
+
+    assert (b"x-request-id", b"abc") in sent[0]["headers"]
+    record = json.loads(stream.getvalue().splitlines()[-1])
+    assert record["message"] == "request"
+    assert record["request_id"] == "abc"
+    assert record["path"] == "/review/"
+    assert record["status"] == 200
+    assert record["db_ms"] == 0.0
+    assert "latency_ms" in record
+
+
+def test_full_queue_drops_and_counts() -> None:
+    log_queue: queue.Queue = queue.Queue(maxsize=2)
+    handler = RequestQueueHandler(log_queue)
+    logger = logging.getLogger("tests.full_queue")
+    logger.propagate = False
+    logger.handlers = [handler]
+
+    for number in range(5):
+        logger.warning("record %s", number)
+    assert log_queue.qsize() == 2
+    assert handler.dropped == 3
+
+    log_queue.get_nowait()
+    log_queue.get_nowait()
+    logger.warning("after")
+    dropped, after = log_queue.get_nowait(), log_queue.get_nowait()
+    assert dropped.getMessage() == "Dropped log records"
+    assert json.loads(JSONFormatter().format(dropped))["dropped"] == 3
+    assert after.getMessage() == "after"
+    assert handler.dropped == 0
+
+
+def test_stop_waits_for_room_on_a_full_queue(restore_root_logger) -> None:
+    stream = SlowStream(0.001)
+    listener = configure_logging(stream, size=5)
+    for number in range(50):
+        logging.getLogger("tests").warning("record %s", number)
+    listener.stop()
+    assert len(stream.getvalue().splitlines()) >= 5
+
+
+def request_cost(app, requests: int) -> float:
+    """Microseconds per request spent in the app, on the event loop"""
+
+    async def run() -> float:
+        started = time.perf_counter()
+        for _ in range(requests):
+            await call(app)
+        return (time.perf_counter() - started) / requests * 1e6
+
+    return asyncio.run(run())
+
+
+def test_logging_cost_per_request(restore_root_logger) -> None:
+    """
+    What an access log costs on the request path: none, the queued handler, and a
+    synchronous handler like the uvicorn access log this replaced. Run with -s for
+    the numbers, stdout is either fast or blocks for 200us per write.
+    """
+    requests = 2000
+    root = logging.getLogger()
+    costs = {"none": request_cost(AccessLogMiddleware(ok_app, 0.0), requests)}
+
+    for name, delay in (("fast", 0.0), ("slow", 0.0002)):
+        listener = configure_logging(SlowStream(delay), size=requests * 2)
+        costs[f"queued, {name} stdout"] = request_cost(
+            AccessLogMiddleware(ok_app), requests
+        )
+        listener.stop()
+
+        handler = logging.StreamHandler(SlowStream(delay))
+        handler.setFormatter(JSONFormatter())
+        root.handlers = [handler]
+        costs[f"synchronous, {name} stdout"] = request_cost(
+            AccessLogMiddleware(ok_app), requests
+        )
+
+    for name, cost in costs.items():
+        print(f"{name:>26}: {cost:7.1f}us per request")
+
+    # The event loop never waits on a blocked stdout
+    assert costs["queued, slow stdout"] < costs["synchronous, slow stdout"] / 2
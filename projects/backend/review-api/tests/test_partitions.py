@@ -0,0 +1,56 @@
+import asyncio
+import datetime
+
+from db.partitions import (
+    DEFAULT_PARTITION,
+    add_months,
+    attached_partitions,
+    ensure_partitions,
+    month_start,
+)
+
+UTC = datetime.timezone.utc
+
+
+def test_months() -> None:
+    start = month_start(datetime.datetime(2026, 12, 31, 23, 59, tzinfo=UTC))
+    assert start == datetime.datetime(2026, 12, 1, tzinfo=UTC)
+    assert add_months(start, 1) == datetime.datetime(2027, 1, 1, tzinfo=UTC)
+    assert add_months(start, -12) == datetime.datetime(2025, 12, 1, tzinfo=UTC)
+
+
+def test_reviews_in_the_default_partition_are_moved(database) -> None:
+    from db.tables import Reviews
+
+    now = datetime.datetime(2099, 1, 1, tzinfo=UTC)
+    names = ["reviews_p2099_01", "reviews_p2099_02", "reviews_p2099_03"]
+
+    async def run() -> None:
+        # Dated in a month with no partition yet, so it lands in the default
+        review = Reviews(
+            title="t",
+            rating=5,
+            body="b",
+            created_on=datetime.datetime(2099, 2, 15, tzinfo=UTC),
+        )
+        await review.save()
+        try:
+            assert await ensure_partitions(months_ahead=2, now=now) == names
+            assert set(names) <= set(await attached_partitions())
+            assert await ensure_partitions(months_ahead=2, now=now) == []
+
+            rows = await Reviews.raw(
+                "SELECT tableoid::regclass::text AS partition FROM reviews "
+                "WHERE id = {}",
+                review.id,
+            )
+            assert rows == [{"partition": "reviews_p2099_02"}]
+            assert not await Reviews.raw(
+                f'SELECT 1 FROM "{DEFAULT_PARTITION}" WHERE id = {{}}', review.id
+            )
+        finally:
+            await Reviews.delete().where(Reviews.id == review.id)
+            for name in names:
+                await Reviews.raw(f'DROP TABLE IF EXISTS "{name}"')
+
+    asyncio.run(run())
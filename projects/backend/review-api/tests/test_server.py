@@ -0,0 +1,125 @@
+import asyncio
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, cast
+
+import httpx
+
+APP = Path(__file__).resolve().parents[1]
+
+# Seconds the server keeps serving after SIGTERM, and how long of that the load
+# balancer still routes new requests to it
+DRAIN = 1.0
+ROUTING_LAG = 0.7
+
+CLIENTS = 20
+TITLE = "test_server"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def wait_until_ready(client: httpx.AsyncClient) -> None:
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get("/review/health")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.1)
+    raise TimeoutError("The server didn't become ready")
+
+
+def test_sigterm_under_load_fails_no_requests(database) -> None:
+    """
+    Loads the server, sends SIGTERM, keeps sending requests while the load balancer
+    would, and holds the last of them in the database past the point the server stops
+    listening. None may fail.
+    """
+    import asyncpg
+    from db.engine import ReviewsEngine
+    from db.tables import Reviews
+
+    port = free_port()
+    process = subprocess.Popen(
+        [sys.executable, "server.py"],
+        cwd=APP,
+        env={
+            **os.environ,
+            "PORT": str(port),
+            "SHUTDOWN_DRAIN": str(DRAIN),
+            "SHUTDOWN_TIMEOUT": "30",
+            "ACCESS_LOG_SAMPLE_RATE": "0",
+            "ADMISSION_MAX_QUEUE_WAIT": "30",
+            "ADMISSION_MAX_POOL_WAIT": "30",
+        },
+        stdout=subprocess.DEVNULL,
+    )
+    results: Dict[str, int] = {}
+    health_after_sigterm = []
+
+    async def run() -> None:
+        async with httpx.AsyncClient(
+            base_url=f"http://127.0.0.1:{port}", timeout=30
+        ) as client:
+            await wait_until_ready(client)
+            stop_sending = asyncio.Event()
+
+            async def send() -> None:
+                sent = 0
+                while not stop_sending.is_set():
+                    sent += 1
+                    try:
+                        if sent % 5 == 0:
+                            response = await client.post(
+                                "/review/",
+                                json={"title": TITLE, "rating": 3, "body": "b"},
+                            )
+                        else:
+                            response = await client.get("/review/?rating=3")
+                        outcome = str(response.status_code)
+                    except httpx.HTTPError as exception:
+                        outcome = type(exception).__name__
+                    results[outcome] = results.get(outcome, 0) + 1
+
+            clients = [asyncio.create_task(send()) for _ in range(CLIENTS)]
+            await asyncio.sleep(1)
+
+            engine = cast(ReviewsEngine, Reviews._meta.db)
+            connection = await asyncpg.connect(**engine.config)
+            process.send_signal(signal.SIGTERM)
+            await asyncio.sleep(0.2)
+            health_after_sigterm.append(
+                (await client.get("/review/health")).status_code
+            )
+
+            # The last requests wait on the lock until after the server stops listening
+            locking = connection.transaction()
+            await locking.start()
+            await connection.execute("LOCK TABLE reviews IN ACCESS EXCLUSIVE MODE")
+            await asyncio.sleep(ROUTING_LAG - 0.2)
+            stop_sending.set()
+            await asyncio.sleep(DRAIN)
+            await locking.rollback()
+            await connection.close()
+            await asyncio.gather(*clients)
+
+    try:
+        asyncio.run(run())
+        assert process.wait(timeout=60) == 0
+    finally:
+        process.kill()
+        Reviews.delete().where(Reviews.title == TITLE).run_sync()
+
+    assert health_after_sigterm == [503]
+    assert set(results) <= {"200", "201"}, results
+    assert sum(results.values()) > CLIENTS
@@ -0,0 +1,71 @@
+import asyncio
+import time
+from typing import cast
+
+SIZE = 4
+
+
+async def first_request(engine, query) -> float:
+    """Milliseconds for a query on a just opened pool, as a new task's first request"""
+    sql, args = query.querystrings[0].compile_string(engine_type=engine.engine_type)
+    started = time.perf_counter()
+    await engine._run_in_pool(sql, args)
+    return (time.perf_counter() - started) * 1000
+
+
+def test_warm_up_fills_the_pool_and_prepares_statements(database) -> None:
+    from crud import ReviewsCRUD
+    from db.engine import ReviewsEngine
+    from db.tables import Reviews
+
+    engine = cast(ReviewsEngine, Reviews._meta.db)
+    queries = ReviewsCRUD().hot_queries()
+
+    async def run() -> None:
+        await engine.start_connection_pool(min_size=0, max_size=SIZE)
+        try:
+            await engine.warm_up(queries, SIZE)
+            pool = engine.pool
+            assert pool
+            assert pool.get_size() == SIZE
+            # All held at once, so each is a different connection
+            connections = [await pool.acquire() for _ in range(SIZE)]
+            try:
+                for connection in connections:
+                    assert len(connection._stmt_cache) >= len(queries)
+            finally:
+                for connection in connections:
+                    await pool.release(connection)
+        finally:
+            await engine.close_connection_pool()
+
+    asyncio.run(run())
+
+
+def test_first_request_latency(database) -> None:
+    """
+    The first request's latency on a new task, with and without the warm-up. Run
+    with -s for the numbers.
+    """
+    from crud import ReviewsCRUD
+    from db.engine import ReviewsEngine
+    from db.tables import Reviews
+
+    engine = cast(ReviewsEngine, Reviews._meta.db)
+    queries = ReviewsCRUD().hot_queries()
+
+    async def run(warm: bool) -> float:
+        await engine.start_connection_pool(min_size=0, max_size=SIZE)
+        try:
+            if warm:
+                await engine.warm_up(queries, SIZE)
+            return await first_request(engine, queries[1])
+        finally:
+            await engine.close_connection_pool()
+
+    cold = min(asyncio.run(run(False)) for _ in range(5))
+    warm = min(asyncio.run(run(True)) for _ in range(5))
+    print(f"first request: {cold:.2f}ms cold, {warm:.2f}ms warmed up")
+
+    # No connection to open, no statement to parse and plan
+    assert warm < cold
@@ -0,0 +1,116 @@
+import datetime
+from typing import Iterator
+
+import pytest
+from fastapi.testclient import TestClient
+
+
+@pytest.fixture
+def review(client) -> Iterator[dict]:
+    created = client.post(
+        "/review/", json={"title": "t", "rating": 5, "body": "b"}
+    ).json()[0]
+    yield created
+    client.delete(f"/review/{created['id']}/")
+
+
+def test_writes_are_one_statement(client, review, queries) -> None:
+    """Each write is a single round trip, where PiccoloCRUD's took several"""
+    path = f"/review/{review['id']}/"
+
+    patched = client.patch(path, json={"rating": 4})
+    assert patched.status_code == 200
+    assert patched.json()["rating"] == 4
+    assert len(queries) == 1
+    assert queries[0].startswith("UPDATE")
+
+    queries.clear()
+    put = client.put(path, json={"title": "u", "rating": 3, "body": "c"})
+    assert put.status_code == 200
+    assert put.json()["title"] == "u"
+    assert len(queries) == 1
+
+    queries.clear()
+    assert client.delete(path).status_code == 204
+    assert len(queries) == 1
+    assert queries[0].startswith("DELETE")
+
+
+def test_each_write_moves_the_version_on(client, review) -> None:
+    path = f"/review/{review['id']}/"
+    fetched = client.get(path)
+    version = fetched.headers["etag"]
+
+    patched = client.patch(path, json={"rating": 4}, headers={"If-Match": version})
+    assert patched.status_code == 200
+    assert patched.headers["etag"] != version
+    modified_on = datetime.datetime.fromisoformat(
+        patched.json()["modified_on"].replace("Z", "+00:00")
+    )
+    # Set by the update itself
+    now = datetime.datetime.now(datetime.timezone.utc)
+    assert abs(now - modified_on) < datetime.timedelta(seconds=5)
+
+    # The old version no longer matches
+    stale = client.patch(path, json={"rating": 3}, headers={"If-Match": version})
+    assert stale.status_code == 412
+    assert client.delete(path, headers={"If-Match": version}).status_code == 412
+
+    current = patched.headers["etag"]
+    # Also as sent back from a compressed response
+    gzipped = current[:-1] + '-gzip"'
+    assert (
+        client.put(
+            path,
+            json={"title": "u", "rating": 3, "body": "c"},
+            headers={"If-Match": gzipped},
+        ).status_code
+        == 200
+    )
+
+
+def test_missing_and_invalid(client) -> None:
+    path = "/review/01a155cc-056a-76f6-8f3e-4d3775be2e33/"
+    assert client.patch(path, json={"rating": 4}).status_code == 404
+    assert (
+        client.patch(path, json={"rating": 4}, headers={"If-Match": '"x"'}).status_code
+        == 400
+    )
+
+
+def test_round_trips_against_piccolo_crud(database, monkeypatch) -> None:
+    """Statements per write, PiccoloCRUD's against ours. Run with -s for the numbers."""
+    from api import reviews_crud
+    from db.engine import ReviewsEngine
+    from db.tables import Reviews
+    from piccolo_api.crud.endpoints import PiccoloCRUD
+
+    statements = 0
+    run_querystring = ReviewsEngine.run_querystring
+
+    async def counting(self, querystring, in_pool=True):
+        nonlocal statements
+        statements += 1
+        return await run_querystring(self, querystring, in_pool=in_pool)
+
+    review = Reviews(title="t", rating=5, body="b")
+    review.save().run_sync()
+    monkeypatch.setattr(ReviewsEngine, "run_querystring", counting)
+    counts = {}
+    try:
+        # Without a pool, each statement runs on a new connection
+        for name, app in (
+            ("PiccoloCRUD", PiccoloCRUD(Reviews, read_only=False)),
+            ("ours", reviews_crud),
+        ):
+            statements = 0
+            response = TestClient(app).patch(f"/{review.id}/", json={"rating": 4})
+            assert response.status_code == 200
+            counts[name] = statements
+    finally:
+        monkeypatch.undo()
+        review.remove().run_sync()
+
+    print(f"statements per PATCH: {counts}")
+    assert counts["ours"] == 1
+    assert counts["PiccoloCRUD"] > counts["ours"]
@@ -0,0 +1,126 @@
+"""
+OpenTelemetry tracing for the review service
+
+Spans are exported over OTLP to the ADOT collector sidecar added by the deployment
+when tracing is enabled. A request is broken down into the FastAPI server span, the
+pool acquisition span from db.engine.ReviewsEngine and one span per asyncpg query.
+"""
+
+import os
+import random
+from typing import Optional, Sequence
+
+from fastapi import FastAPI
+from opentelemetry import trace
+from opentelemetry.context import Context
+from opentelemetry.instrumentation.asyncpg import AsyncPGInstrumentor
+from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
+from opentelemetry.sdk.resources import SERVICE_NAME, Resource
+from opentelemetry.sdk.trace import SpanProcessor, TracerProvider
+from opentelemetry.sdk.trace.export import BatchSpanProcessor
+from opentelemetry.sdk.trace.sampling import (
+    Decision,
+    ParentBased,
+    Sampler,
+    SamplingResult,
+    TraceIdRatioBased,
+)
+from opentelemetry.trace import Link, SpanKind, TraceState, get_current_span
+from opentelemetry.util.types import Attributes
+
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "false").lower() == "true"
+
+# Head sampling, the fraction of requests that are recorded. A traceparent header sent
+# by the client keeps its trace id, but not its sampled flag, see RemoteParentSampler.
+TRACE_SAMPLE_RATIO = float(os.getenv("TRACE_SAMPLE_RATIO", "0.05"))
+
+SERVICE = os.getenv("OTEL_SERVICE_NAME", "reviews_api")
+
+# Health checks would otherwise dominate the sampled traces
+EXCLUDED_URLS = "review/health"
+
+
+class RemoteParentSampler(Sampler):
+    """
+    Samples a ratio of the requests that arrive with a trace context, chosen at random.
+    Every request comes from outside the system, so neither the parent's sampled flag
+    nor its trace id (which TraceIdRatioBased would decide on) can be trusted, either
+    would let a client have every one of its requests recorded.
+    """
+
+    def __init__(self, ratio: float) -> None:
+        self.ratio = ratio
+
+    def should_sample(
+        self,
+        parent_context: Optional[Context],
+        trace_id: int,
+        name: str,
+        kind: Optional[SpanKind] = None,
+        attributes: Attributes = None,
+        links: Optional[Sequence[Link]] = None,
+        trace_state: Optional[TraceState] = None,
+    ) -> SamplingResult:
+        if random.random() >= self.ratio:
+            return SamplingResult(Decision.DROP)
+        parent = get_current_span(parent_context).get_span_context()
+        return SamplingResult(
+            Decision.RECORD_AND_SAMPLE, attributes, parent.trace_state
+        )
+
+    def get_description(self) -> str:
+        return f"RemoteParentSampler{{{self.ratio}}}"
+
+
+def sampler(ratio: float) -> Sampler:
+    """
+    Spans started in this process follow their parent, new traces are sampled by trace
+    id and traces continued from a request header at random
+    """
+    remote = RemoteParentSampler(ratio)
+    return ParentBased(
+        TraceIdRatioBased(ratio),
+        remote_parent_sampled=remote,
+        remote_parent_not_sampled=remote,
+    )
+
+
+def instrument_app(app: FastAPI, provider: TracerProvider) -> None:
+    """A server span for each request but health checks"""
+    # The ASGI receive/send spans don't break a request down any further, and would
+    # triple the spans started per request, sampled or not
+    FastAPIInstrumentor.instrument_app(
+        app,
+        tracer_provider=provider,
+        excluded_urls=EXCLUDED_URLS,
+        exclude_spans=["receive", "send"],
+    )
+
+
+def configure_tracing(
+    app: FastAPI,
+    sample_ratio: float = TRACE_SAMPLE_RATIO,
+    span_processor: Optional[SpanProcessor] = None,
+) -> TracerProvider:
+    """
+    Instruments the app and the asyncpg driver. span_processor defaults to a batched
+    OTLP exporter, pass e.g. SimpleSpanProcessor(InMemorySpanExporter()) to inspect
+    spans locally.
+    """
+    if span_processor is None:
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import (
+            OTLPSpanExporter,
+        )
+
+        span_processor = BatchSpanProcessor(OTLPSpanExporter())
+
+    provider = TracerProvider(
+        resource=Resource.create({SERVICE_NAME: SERVICE}),
+        sampler=sampler(sample_ratio),
+    )
+    provider.add_span_processor(span_processor)
+    trace.set_tracer_provider(provider)
+
+    instrument_app(app, provider)
+    AsyncPGInstrumentor().instrument(tracer_provider=provider)
+    return provider
@@ -188,3 +188,8 @@ pulumi.export("cluster_arn", cluster.arn)
 pulumi.export("service_namespace_arn", service_connect_namespace.arn)
 pulumi.export("task_shared_security_group_id", task_shared_security_group.id)
 pulumi.export("task_shared_execution_role_arn", task_shared_execution_role.arn)
+
+# The split between FARGATE and FARGATE_SPOT, for services setting their own strategy
+pulumi.export("fargate_base", fargate_base)
+pulumi.export("fargate_weight", fargate_weight)
+pulumi.export("fargate_spot_weight", fargate_spot_weight)
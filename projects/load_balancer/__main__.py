@@ -1,7 +1,7 @@
 """
 load_balancer
 
-Creates an application load balancer
+Creates an application load balancer, optionally fronted by a CloudFront distribution
 """
 import os
 
@@ -30,17 +30,63 @@ root_domain_certificate_arn = certificates.require_output("root_domain_certifica
 CONFIG = pulumi.Config()
 domain_name = CONFIG.require("domain")
 hosted_zone_id = CONFIG.require("hosted_zone_id")
+cloudfront_enabled = CONFIG.require_bool("cloudfront_enabled")
+cloudfront_price_class = CONFIG.require("cloudfront_price_class")
+
+# Query parameters understood by the review service's CRUD endpoints. Only these
+# take part in the edge cache key, and only these reach the origin, so a parameter
+# outside the key can't change a cached response. Kept in step with
+# CACHE_KEY_QUERY_STRINGS in projects/backend/review-api/cache.py.
+REVIEW_CACHE_QUERY_STRINGS = [
+    "__order",
+    "__page",
+    "__page_size",
+    "__visible_fields",
+    "fields",
+    "__readable",
+    "__range_header",
+    "__range_header_name",
+    "id",
+    "ids",
+    "title",
+    "title__match",
+    "rating",
+    "rating__operator",
+    "body",
+    "body__match",
+    "created_on",
+    "created_on__operator",
+    "modified_on",
+    "modified_on__operator",
+]
+
+# AWS managed CloudFront policies
+# https://docs.aws.amazon.com/AmazonCloudFront/latest/DeveloperGuide/using-managed-cache-policies.html
+CACHING_DISABLED_POLICY_ID = "4135ea2d-6df8-44a3-9df3-4b5a84be39ad"
+ALL_VIEWER_EXCEPT_HOST_HEADER_POLICY_ID = "b689b0a8-53d0-40ab-baf2-68738e2966ac"
 
 # ---------------------------------------------------------------------------------------
 # application load balancer
 # https://www.pulumi.com/registry/packages/aws/api-docs/lb/loadbalancer/
 # ---------------------------------------------------------------------------------------
-# lb security group
-security_group = aws.ec2.SecurityGroup(
-    "load-balancer-security-group",
-    description="Security group for application load balancer",
-    vpc_id=vpc_id,
-    ingress=[
+# lb security group, open to the world, or only to CloudFront when the distribution is
+# enabled so the cache can't be bypassed through the load balancer's own address.
+# CloudFront only talks to the origin over https, see the distribution below.
+if cloudfront_enabled:
+    # ~55 entries, each counting as a rule towards the security group's quota of 60
+    cloudfront_prefix_list = aws.ec2.get_managed_prefix_list(
+        name="com.amazonaws.global.cloudfront.origin-facing"
+    )
+    load_balancer_ingress = [
+        aws.ec2.SecurityGroupIngressArgs(
+            protocol="tcp",
+            from_port=443,
+            to_port=443,
+            prefix_list_ids=[cloudfront_prefix_list.id],
+        ),
+    ]
+else:
+    load_balancer_ingress = [
         aws.ec2.SecurityGroupIngressArgs(
             protocol="tcp",
             from_port=80,
@@ -53,7 +99,13 @@ security_group = aws.ec2.SecurityGroup(
             to_port=443,
             cidr_blocks=["0.0.0.0/0"],
         ),
-    ],
+    ]
+
+security_group = aws.ec2.SecurityGroup(
+    "load-balancer-security-group",
+    description="Security group for application load balancer",
+    vpc_id=vpc_id,
+    ingress=load_balancer_ingress,
     egress=[
         aws.ec2.SecurityGroupEgressArgs(
             protocol="-1",
@@ -109,7 +161,177 @@ https_listener = aws.lb.Listener(
     ],
 )
 
-# A record alias to load balancer
+# ---------------------------------------------------------------------------------------
+# cloudfront distribution (optional)
+# https://www.pulumi.com/registry/packages/aws/api-docs/cloudfront/distribution/
+# Reads of /review/* are cached at the edge, keyed on the CRUD query parameters. CloudFront
+# never caches anything but GET/HEAD, so writes pass straight through to the load balancer.
+# The services decide how long a response lives via Cache-Control and purge on writes.
+# ---------------------------------------------------------------------------------------
+distribution = None
+if cloudfront_enabled:
+    # CloudFront only accepts certificates from us-east-1
+    us_east_1 = aws.Provider("us-east-1", region="us-east-1")
+
+    cloudfront_certificate = aws.acm.Certificate(
+        "cloudfront-certificate",
+        domain_name=f"api.{domain_name}",
+        validation_method="DNS",
+        tags=TAGS,
+        opts=pulumi.ResourceOptions(provider=us_east_1),
+    )
+
+    cloudfront_validation_record = aws.route53.Record(
+        "cloudfront-validation-record",
+        name=cloudfront_certificate.domain_validation_options[0].resource_record_name,
+        records=[
+            cloudfront_certificate.domain_validation_options[0].resource_record_value
+        ],
+        ttl=300,
+        type=cloudfront_certificate.domain_validation_options[0].resource_record_type,
+        zone_id=hosted_zone_id,
+        opts=pulumi.ResourceOptions(parent=cloudfront_certificate),
+    )
+
+    cloudfront_certificate_validation = aws.acm.CertificateValidation(
+        "cloudfront-certificate-validation",
+        certificate_arn=cloudfront_certificate.arn,
+        validation_record_fqdns=[cloudfront_validation_record.fqdn],
+        opts=pulumi.ResourceOptions(parent=cloudfront_certificate, provider=us_east_1),
+    )
+
+    # CloudFront talks to the load balancer through its own name, covered by the
+    # wildcard certificate on the https listener
+    origin_record = aws.route53.Record(
+        "load-balancer-origin-a-record",
+        zone_id=hosted_zone_id,
+        name=f"api-origin.{domain_name}",
+        type="A",
+        aliases=[
+            aws.route53.RecordAliasArgs(
+                name=load_balancer.dns_name,
+                zone_id=load_balancer.zone_id,
+                evaluate_target_health=True,
+            )
+        ],
+    )
+
+    review_cache_policy = aws.cloudfront.CachePolicy(
+        "review-cache-policy",
+        name=f"review-api-{STACK}",
+        comment="Review reads keyed on CRUD query parameters",
+        min_ttl=0,
+        default_ttl=0,  # nothing is cached unless the origin says so
+        max_ttl=86400,
+        parameters_in_cache_key_and_forwarded_to_origin=aws.cloudfront.CachePolicyParametersInCacheKeyAndForwardedToOriginArgs(
+            cookies_config=aws.cloudfront.CachePolicyParametersInCacheKeyAndForwardedToOriginCookiesConfigArgs(
+                cookie_behavior="none",
+            ),
+            headers_config=aws.cloudfront.CachePolicyParametersInCacheKeyAndForwardedToOriginHeadersConfigArgs(
+                header_behavior="none",
+            ),
+            query_strings_config=aws.cloudfront.CachePolicyParametersInCacheKeyAndForwardedToOriginQueryStringsConfigArgs(
+                query_string_behavior="whitelist",
+                query_strings=aws.cloudfront.CachePolicyParametersInCacheKeyAndForwardedToOriginQueryStringsConfigQueryStringsArgs(
+                    items=REVIEW_CACHE_QUERY_STRINGS,
+                ),
+            ),
+            enable_accept_encoding_gzip=True,
+            enable_accept_encoding_brotli=True,
+        ),
+    )
+
+    # Viewer headers and cookies as AllViewerExceptHostHeader forwards them, but no
+    # query strings, the cache policy still forwards the ones in its key
+    review_origin_request_policy = aws.cloudfront.OriginRequestPolicy(
+        "review-origin-request-policy",
+        name=f"review-api-{STACK}",
+        comment="Review requests without query strings outside the cache key",
+        cookies_config=aws.cloudfront.OriginRequestPolicyCookiesConfigArgs(
+            cookie_behavior="all",
+        ),
+        headers_config=aws.cloudfront.OriginRequestPolicyHeadersConfigArgs(
+            header_behavior="allExcept",
+            headers=aws.cloudfront.OriginRequestPolicyHeadersConfigHeadersArgs(
+                items=["host"],
+            ),
+        ),
+        query_strings_config=aws.cloudfront.OriginRequestPolicyQueryStringsConfigArgs(
+            query_string_behavior="none",
+        ),
+    )
+
+    distribution = aws.cloudfront.Distribution(
+        "distribution",
+        enabled=True,
+        comment=f"api.{domain_name}",
+        aliases=[f"api.{domain_name}"],
+        http_version="http2and3",
+        is_ipv6_enabled=True,
+        price_class=cloudfront_price_class,
+        origins=[
+            aws.cloudfront.DistributionOriginArgs(
+                origin_id="load-balancer",
+                domain_name=origin_record.fqdn,
+                custom_origin_config=aws.cloudfront.DistributionOriginCustomOriginConfigArgs(
+                    http_port=80,
+                    https_port=443,
+                    origin_protocol_policy="https-only",
+                    origin_ssl_protocols=["TLSv1.2"],
+                ),
+            )
+        ],
+        # Anything that isn't a known service is passed through uncached
+        default_cache_behavior=aws.cloudfront.DistributionDefaultCacheBehaviorArgs(
+            target_origin_id="load-balancer",
+            viewer_protocol_policy="redirect-to-https",
+            allowed_methods=[
+                "GET",
+                "HEAD",
+                "OPTIONS",
+                "PUT",
+                "POST",
+                "PATCH",
+                "DELETE",
+            ],
+            cached_methods=["GET", "HEAD"],
+            cache_policy_id=CACHING_DISABLED_POLICY_ID,
+            origin_request_policy_id=ALL_VIEWER_EXCEPT_HOST_HEADER_POLICY_ID,
+        ),
+        ordered_cache_behaviors=[
+            aws.cloudfront.DistributionOrderedCacheBehaviorArgs(
+                path_pattern="/review/*",
+                target_origin_id="load-balancer",
+                viewer_protocol_policy="redirect-to-https",
+                allowed_methods=[
+                    "GET",
+                    "HEAD",
+                    "OPTIONS",
+                    "PUT",
+                    "POST",
+                    "PATCH",
+                    "DELETE",
+                ],
+                cached_methods=["GET", "HEAD"],
+                cache_policy_id=review_cache_policy.id,
+                origin_request_policy_id=review_origin_request_policy.id,
+                compress=True,
+            )
+        ],
+        restrictions=aws.cloudfront.DistributionRestrictionsArgs(
+            geo_restriction=aws.cloudfront.DistributionRestrictionsGeoRestrictionArgs(
+                restriction_type="none",
+            ),
+        ),
+        viewer_certificate=aws.cloudfront.DistributionViewerCertificateArgs(
+            acm_certificate_arn=cloudfront_certificate_validation.certificate_arn,
+            ssl_support_method="sni-only",
+            minimum_protocol_version="TLSv1.2_2021",
+        ),
+        tags=TAGS,
+    )
+
+# A record alias to load balancer, or to the distribution when it is enabled
 load_balancer_record = aws.route53.Record(
     "load-balancer-a-record",
     zone_id=hosted_zone_id,
@@ -117,6 +339,12 @@ load_balancer_record = aws.route53.Record(
     type="A",
     aliases=[
         aws.route53.RecordAliasArgs(
+            name=distribution.domain_name,
+            zone_id=distribution.hosted_zone_id,
+            evaluate_target_health=False,
+        )
+        if distribution
+        else aws.route53.RecordAliasArgs(
             name=load_balancer.dns_name,
             zone_id=load_balancer.zone_id,
             evaluate_target_health=True,
@@ -130,3 +358,5 @@ pulumi.export("load_balancer_zone_id", load_balancer.zone_id)
 pulumi.export("load_balancer_security_group_id", security_group.id)
 pulumi.export("http_listener_arn", http_listener.arn)
 pulumi.export("https_listener_arn", https_listener.arn)
+pulumi.export("cloudfront_distribution_id", distribution.id if distribution else None)
+pulumi.export("cloudfront_distribution_arn", distribution.arn if distribution else None)